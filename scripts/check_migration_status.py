@@ -12,34 +12,32 @@ def check_status():
     cur = conn.cursor()
     
     try:
-        # Check table existence
-        cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'leads')")
-        leads_exists = cur.fetchone()[0]
+        # Check table existence (one round-trip for all three tables)
+        cur.execute("""
+            SELECT
+                EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'leads'),
+                EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'bad_leads'),
+                EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'lost_leads')
+        """)
+        leads_exists, bad_leads_exists, lost_leads_exists = cur.fetchone()
         print(f"✓ leads table exists: {leads_exists}")
-        
-        cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'bad_leads')")
-        bad_leads_exists = cur.fetchone()[0]
         print(f"✓ bad_leads table exists: {bad_leads_exists}")
-        
-        cur.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'lost_leads')")
-        lost_leads_exists = cur.fetchone()[0]
         print(f"✓ lost_leads table exists: {lost_leads_exists}")
         
         if leads_exists:
-            cur.execute("SELECT COUNT(*) FROM leads")
-            total = cur.fetchone()[0]
+            # One pass over leads for the total and the per-type counts
+            cur.execute("""
+                SELECT
+                    COUNT(*),
+                    COUNT(*) FILTER (WHERE lead_type = 'BAD'),
+                    COUNT(*) FILTER (WHERE lead_type = 'LOST'),
+                    COUNT(*) FILTER (WHERE lead_type IS NULL OR lead_type = 'STANDARD')
+                FROM leads
+            """)
+            total, bad, lost, standard = cur.fetchone()
             print(f"\n📊 leads table: {total:,} total records")
-            
-            cur.execute("SELECT COUNT(*) FROM leads WHERE lead_type = 'BAD'")
-            bad = cur.fetchone()[0]
             print(f"   - BAD: {bad:,}")
-            
-            cur.execute("SELECT COUNT(*) FROM leads WHERE lead_type = 'LOST'")
-            lost = cur.fetchone()[0]
             print(f"   - LOST: {lost:,}")
-            
-            cur.execute("SELECT COUNT(*) FROM leads WHERE lead_type IS NULL OR lead_type = 'STANDARD'")
-            standard = cur.fetchone()[0]
             print(f"   - STANDARD/NULL: {standard:,}")
             
             cur.execute("SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'leads' AND column_name = 'customer_id')")
@@ -47,16 +45,16 @@ def check_status():
             print(f"\n✓ customer_id column exists: {has_customer_id}")
         
         if bad_leads_exists:
-            cur.execute("SELECT COUNT(*) FROM bad_leads")
-            bad_count = cur.fetchone()[0]
+            cur.execute("""
+                SELECT
+                    COUNT(*),
+                    COUNT(lead_status_id),
+                    COUNT(*) FILTER (WHERE lead_status_id IS NULL)
+                FROM bad_leads
+            """)
+            bad_count, linked, unlinked = cur.fetchone()
             print(f"\n📊 bad_leads table: {bad_count:,} records remaining")
-            
-            cur.execute("SELECT COUNT(*) FROM bad_leads WHERE lead_status_id IS NOT NULL")
-            linked = cur.fetchone()[0]
             print(f"   - Linked to leads: {linked:,}")
-            
-            cur.execute("SELECT COUNT(*) FROM bad_leads WHERE lead_status_id IS NULL")
-            unlinked = cur.fetchone()[0]
             print(f"   - Not linked: {unlinked:,}")
         
         if lost_leads_exists:
@@ -34,24 +34,19 @@ NAME_VARIATIONS = {
 }
 
 
-def find_sales_persons_by_names(conn, names: list) -> list:
+def find_sales_persons_by_names(cursor, names: list) -> list:
     """Find SalesPerson records by names."""
-    cursor = conn.cursor()
     placeholders = ','.join(['%s'] * len(names))
     cursor.execute(f"""
         SELECT id, name, normalized_name
         FROM sales_persons
         WHERE name IN ({placeholders})
     """, names)
-    results = cursor.fetchall()
-    cursor.close()
-    return results
+    return cursor.fetchall()
 
 
-def count_relationships(conn, sales_person_id: str) -> int:
+def count_relationships(cursor, sales_person_id: str) -> int:
     """Count total relationships for a SalesPerson."""
-    cursor = conn.cursor()
-    
     cursor.execute("""
         SELECT 
             (SELECT COUNT(*) FROM jobs WHERE sales_person_id = %s) +
@@ -62,21 +57,17 @@ def count_relationships(conn, sales_person_id: str) -> int:
     """, (sales_person_id, sales_person_id, sales_person_id, sales_person_id, sales_person_id))
     
     result = cursor.fetchone()
-    cursor.close()
     return result[0] if result else 0
 
 
-def merge_sales_person_variations(conn, canonical_name: str, variation_names: list):
-    """Merge SalesPerson variations into canonical record."""
-    cursor = conn.cursor()
-    
+def merge_sales_person_variations(cursor, canonical_name: str, variation_names: list):
+    """Merge SalesPerson variations into canonical record. The caller commits."""
     # Find all variation records
     all_names = [canonical_name] + variation_names
-    records = find_sales_persons_by_names(conn, all_names)
+    records = find_sales_persons_by_names(cursor, all_names)
     
     if len(records) < 2:
         logger.info(f"Only {len(records)} record(s) found for {canonical_name}, skipping merge")
-        cursor.close()
         return 0
     
     # Find canonical record (prefer exact match, then most relationships)
@@ -94,7 +85,7 @@ def merge_sales_person_variations(conn, canonical_name: str, variation_names: li
         best_record = None
         best_count = -1
         for sp_id, sp_name, sp_normalized in records:
-            count = count_relationships(conn, sp_id)
+            count = count_relationships(cursor, sp_id)
             if count > best_count:
                 best_count = count
                 best_record = (sp_id, sp_name, sp_normalized)
@@ -146,16 +137,18 @@ def merge_sales_person_variations(conn, canonical_name: str, variation_names: li
         """, (canonical_id, dup_id))
         spf_updated = cursor.rowcount
         
-        # Update names in related tables
-        cursor.execute("""
-            UPDATE sales_performance SET name = %s WHERE name = %s
-        """, (canonical_name, dup_name))
-        spf_names_updated = cursor.rowcount
-        
+        # Update names in related tables in one round-trip (the CTEs touch different tables)
         cursor.execute("""
-            UPDATE user_performance SET name = %s WHERE name = %s
-        """, (canonical_name, dup_name))
-        up_names_updated = cursor.rowcount
+            WITH spf AS (
+                UPDATE sales_performance SET name = %(canonical)s WHERE name = %(dup)s
+                RETURNING 1
+            ), up AS (
+                UPDATE user_performance SET name = %(canonical)s WHERE name = %(dup)s
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM spf), (SELECT COUNT(*) FROM up)
+        """, {'canonical': canonical_name, 'dup': dup_name})
+        spf_names_updated, up_names_updated = cursor.fetchone()
         
         total_updated += jobs_updated + bo_updated + ls_updated + up_updated + spf_updated
         
@@ -168,8 +161,6 @@ def merge_sales_person_variations(conn, canonical_name: str, variation_names: li
         cursor.execute("DELETE FROM sales_persons WHERE id = %s", (dup_id,))
         logger.info(f"Deleted duplicate SalesPerson: {dup_name}")
     
-    conn.commit()
-    cursor.close()
     return total_updated
 
 
@@ -192,32 +183,33 @@ def main():
                                        notes="Merge SalesPerson name variations"):
             return 0
         
-        # Check if there's any work to do
-        cursor = conn.cursor()
-        all_names = []
-        for canonical_name, variation_names in NAME_VARIATIONS.items():
-            all_names.extend([canonical_name] + variation_names)
-        
-        placeholders = ','.join(['%s'] * len(all_names))
-        cursor.execute(f"""
-            SELECT COUNT(DISTINCT name)
-            FROM sales_persons
-            WHERE name IN ({placeholders})
-        """, all_names)
-        result = cursor.fetchone()
-        distinct_count = result[0] if result else 0
-        cursor.close()
-        
-        if distinct_count <= len(NAME_VARIATIONS):
-            logger.info("No variations found to merge. All SalesPerson names are already canonical.")
-            return 0
-        
         total_merged = 0
         
-        for canonical_name, variation_names in NAME_VARIATIONS.items():
-            log_step("Merge", f"Merging variations for: {canonical_name}")
-            merged = merge_sales_person_variations(conn, canonical_name, variation_names)
-            total_merged += merged
+        # One cursor for the whole session
+        with conn.cursor() as cursor:
+            # Check if there's any work to do
+            all_names = []
+            for canonical_name, variation_names in NAME_VARIATIONS.items():
+                all_names.extend([canonical_name] + variation_names)
+            
+            placeholders = ','.join(['%s'] * len(all_names))
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT name)
+                FROM sales_persons
+                WHERE name IN ({placeholders})
+            """, all_names)
+            result = cursor.fetchone()
+            distinct_count = result[0] if result else 0
+            
+            if distinct_count <= len(NAME_VARIATIONS):
+                logger.info("No variations found to merge. All SalesPerson names are already canonical.")
+                return 0
+            
+            for canonical_name, variation_names in NAME_VARIATIONS.items():
+                log_step("Merge", f"Merging variations for: {canonical_name}")
+                merged = merge_sales_person_variations(cursor, canonical_name, variation_names)
+                conn.commit()
+                total_merged += merged
         
         log_success(f"Name variation merge complete: {total_merged} relationships updated")
         return 0
@@ -11,6 +11,9 @@ from datetime import datetime
 import logging
 import re
 
+import numpy as np
+import pandas as pd
+
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
@@ -22,6 +25,17 @@ logger = logging.getLogger(__name__)
 
 SCRIPT_NAME = "populate_branches"
 
+# Above this many branch names, city/state extraction switches to pandas string ops
+VECTORIZE_THRESHOLD = 1000
+
+# (substrings, state) pairs checked in order by both the scalar and vectorized extractors
+STATE_PATTERNS = [
+    (("ON", "ONTARIO"), "ON"),
+    (("BC", "BRITISH COLUMBIA"), "BC"),
+    (("AB", "ALBERTA"), "AB"),
+    (("QC", "QUEBEC"), "QC"),
+]
+
 
 def normalize_branch_name(name: str) -> str:
     """Normalize a branch name for matching."""
@@ -63,18 +77,39 @@ def extract_city_from_branch_name(name: str) -> tuple[str, str]:
     
     # State/province detection (simplified - would need more logic for real implementation)
     state = None
-    if "ON" in name_upper or "ONTARIO" in name_upper:
-        state = "ON"
-    elif "BC" in name_upper or "BRITISH COLUMBIA" in name_upper:
-        state = "BC"
-    elif "AB" in name_upper or "ALBERTA" in name_upper:
-        state = "AB"
-    elif "QC" in name_upper or "QUEBEC" in name_upper:
-        state = "QC"
+    for substrings, code in STATE_PATTERNS:
+        if any(substring in name_upper for substring in substrings):
+            state = code
+            break
     
     return (city, state)
 
 
+def extract_cities_from_branch_names(names: list) -> list:
+    """
+    Extract (city, state) for many branch names at once.
+    
+    Same rules as extract_city_from_branch_name, but evaluated with pandas
+    string ops when there are enough names for the vectorized path to pay off.
+    """
+    if len(names) < VECTORIZE_THRESHOLD:
+        return [extract_city_from_branch_name(name) for name in names]
+    
+    s = pd.Series(names, dtype=object).fillna("")
+    upper = s.str.upper()
+    
+    state = np.select(
+        [upper.str.contains("|".join(map(re.escape, substrings)), regex=True)
+         for substrings, _ in STATE_PATTERNS],
+        [code for _, code in STATE_PATTERNS],
+        default=None,
+    )
+    city = s.str.split().str[-1].str.title()
+    city = city.where(city.notna() & (s != ""), None)
+    
+    return list(zip(city.tolist(), state.tolist()))
+
+
 def get_unique_branch_names(conn):
     """Get all unique branch_name values from all tables."""
     cursor = conn.cursor()
@@ -108,12 +143,11 @@ def create_branches(conn, dry_run: bool = True):
     created_count = 0
     branch_map = {}  # original_name -> branch_id
     
-    total = len(branch_names)
-    for idx, branch_name in enumerate(branch_names, 1):
-        if idx % 10 == 0:
-            logger.info(f"Processing branch {idx}/{total}...")
+    locations = extract_cities_from_branch_names(branch_names)
+    
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    for branch_name, (city, state) in zip(branch_names, locations):
         normalized_name = normalize_branch_name(branch_name)
-        city, state = extract_city_from_branch_name(branch_name)
         
         # Check if already exists
         cursor.execute("""
@@ -123,7 +157,8 @@ def create_branches(conn, dry_run: bool = True):
         
         if existing:
             branch_map[branch_name] = existing[0]
-            logger.debug(f"Branch '{branch_name}' already exists")
+            if debug_enabled:
+                logger.debug(f"Branch '{branch_name}' already exists")
         else:
             if not dry_run:
                 cursor.execute("""
@@ -134,13 +169,18 @@ def create_branches(conn, dry_run: bool = True):
                 new_id = cursor.fetchone()[0]
                 branch_map[branch_name] = new_id
                 created_count += 1
-                logger.info(f"Created branch: '{branch_name}' (city: {city}, state: {state})")
+                if debug_enabled:
+                    logger.debug(f"Created branch: '{branch_name}' (city: {city}, state: {state})")
             else:
                 created_count += 1
-                logger.info(f"[DRY RUN] Would create branch: '{branch_name}' (city: {city}, state: {state})")
+                if debug_enabled:
+                    logger.debug(f"[DRY RUN] Would create branch: '{branch_name}' (city: {city}, state: {state})")
     
     if not dry_run:
         conn.commit()
+        logger.info(f"Created {created_count} branches")
+    else:
+        logger.info(f"[DRY RUN] Would create {created_count} branches")
     
     cursor.close()
     return branch_map, created_count
@@ -156,7 +196,7 @@ def link_jobs_to_branches(conn, branch_map: dict, dry_run: bool = True):
         updates = list(branch_map.items())
         updated_count = 0
         
-        for idx, (branch_name, branch_id) in enumerate(updates, 1):
+        for branch_name, branch_id in updates:
             cursor.execute("""
                 UPDATE jobs
                 SET branch_id = %s, updated_at = NOW()
@@ -164,9 +204,6 @@ def link_jobs_to_branches(conn, branch_map: dict, dry_run: bool = True):
                   AND branch_id IS NULL
             """, (branch_id, branch_name))
             updated_count += cursor.rowcount
-            
-            if idx % 10 == 0:
-                logger.info(f"Linked {idx}/{len(updates)} branches to jobs...")
     else:
         # Estimate for dry-run
         cursor.execute("SELECT COUNT(*) FROM jobs WHERE branch_name IS NOT NULL")
@@ -190,7 +227,7 @@ def link_booked_opportunities_to_branches(conn, branch_map: dict, dry_run: bool
         updates = list(branch_map.items())
         updated_count = 0
         
-        for idx, (branch_name, branch_id) in enumerate(updates, 1):
+        for branch_name, branch_id in updates:
             cursor.execute("""
                 UPDATE booked_opportunities
                 SET branch_id = %s, updated_at = NOW()
@@ -198,9 +235,6 @@ def link_booked_opportunities_to_branches(conn, branch_map: dict, dry_run: bool
                   AND branch_id IS NULL
             """, (branch_id, branch_name))
             updated_count += cursor.rowcount
-            
-            if idx % 10 == 0:
-                logger.info(f"Linked {idx}/{len(updates)} branches to booked_opportunities...")
     else:
         cursor.execute("SELECT COUNT(*) FROM booked_opportunities WHERE branch_name IS NOT NULL")
         result = cursor.fetchone()
@@ -224,7 +258,7 @@ def link_lead_status_to_branches(conn, branch_map: dict, dry_run: bool = True):
         updates = list(branch_map.items())
         updated_count = 0
         
-        for idx, (branch_name, branch_id) in enumerate(updates, 1):
+        for branch_name, branch_id in updates:
             cursor.execute("""
                 UPDATE lead_status
                 SET branch_id = %s, updated_at = NOW()
@@ -232,9 +266,6 @@ def link_lead_status_to_branches(conn, branch_map: dict, dry_run: bool = True):
                   AND branch_id IS NULL
             """, (branch_id, branch_name))
             updated_count += cursor.rowcount
-            
-            if idx % 10 == 0:
-                logger.info(f"Linked {idx}/{len(updates)} branches to lead_status...")
     else:
         cursor.execute("SELECT COUNT(*) FROM lead_status WHERE branch_name IS NOT NULL")
         result = cursor.fetchone()
@@ -4,12 +4,15 @@ Create lead_sources lookup table and populate it from existing referral_source v
 Then link LeadStatus, BadLead, and LostLead records to the lookup table.
 """
 
+import io
 import sys
 from pathlib import Path
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 import logging
 import re
+from uuid import uuid4
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -89,6 +92,14 @@ def get_unique_referral_sources(conn):
     return sorted(sources)
 
 
+def _copy_text(value: str) -> str:
+    """Escape a value for COPY text format."""
+    return (value.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
 def create_lead_sources(conn, dry_run: bool = True, batch_size: int = 100):
     """Create lead_sources lookup table entries."""
     cursor = conn.cursor()
@@ -97,41 +108,58 @@ def create_lead_sources(conn, dry_run: bool = True, batch_size: int = 100):
     sources = get_unique_referral_sources(conn)
     logger.info(f"Found {len(sources)} unique referral sources")
     
-    created_count = 0
-    source_map = {}  # original -> lead_source_id
+    # Several raw sources can normalize to the same name; the first one wins the category
+    normalized = {source: normalize_lead_source(source) for source in sources}
+    new_sources = {}  # normalized_name -> category
+    for normalized_name, category in normalized.values():
+        new_sources.setdefault(normalized_name, category)
+    
+    # Look up existing sources in one round-trip
+    cursor.execute("""
+        SELECT name, id FROM lead_sources WHERE name = ANY(%s)
+    """, (list(new_sources),))
+    name_to_id = dict(cursor.fetchall())
+    for name in name_to_id:
+        new_sources.pop(name, None)
     
-    total = len(sources)
-    for idx, source in enumerate(sources, 1):
-        if idx % 100 == 0:
-            logger.info(f"Processing lead source {idx}/{total}...")
-        normalized_name, category = normalize_lead_source(source)
+    created_count = len(new_sources)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        prefix = "[DRY RUN] Would create" if dry_run else "Creating"
+        for normalized_name, category in new_sources.items():
+            logger.debug(f"{prefix} lead source: '{normalized_name}' (category: {category})")
+    
+    if not dry_run and new_sources:
+        # Bulk-load new rows with COPY, then fetch their ids back in one query.
+        # Timestamps come from the server clock, as NOW() would in an INSERT: updated_at
+        # has no column default, and the client's time zone may differ from the server's
+        cursor.execute("SELECT LOCALTIMESTAMP")
+        now = cursor.fetchone()[0].isoformat(sep=' ')
+        buffer = io.StringIO()
+        for normalized_name, category in new_sources.items():
+            buffer.write(f"{uuid4()}\t{_copy_text(normalized_name)}\t{_copy_text(category)}"
+                         f"\ttrue\t{now}\t{now}\n")
+        buffer.seek(0)
+        cursor.copy_expert("""
+            COPY lead_sources (id, name, category, is_active, created_at, updated_at) FROM STDIN
+        """, buffer)
         
-        # Check if already exists
         cursor.execute("""
-            SELECT id FROM lead_sources WHERE name = %s
-        """, (normalized_name,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            source_map[source] = existing[0]
-            logger.debug(f"Lead source '{normalized_name}' already exists")
-        else:
-            if not dry_run:
-                cursor.execute("""
-                    INSERT INTO lead_sources (id, name, category, is_active, created_at, updated_at)
-                    VALUES (gen_random_uuid(), %s, %s, true, NOW(), NOW())
-                    RETURNING id
-                """, (normalized_name, category))
-                new_id = cursor.fetchone()[0]
-                source_map[source] = new_id
-                created_count += 1
-                logger.info(f"Created lead source: '{normalized_name}' (category: {category})")
-            else:
-                created_count += 1
-                logger.info(f"[DRY RUN] Would create lead source: '{normalized_name}' (category: {category})")
+            SELECT name, id FROM lead_sources WHERE name = ANY(%s)
+        """, (list(new_sources),))
+        name_to_id.update(cursor.fetchall())
+    
+    source_map = {  # original -> lead_source_id
+        source: name_to_id[normalized_name]
+        for source, (normalized_name, _) in normalized.items()
+        if normalized_name in name_to_id
+    }
     
     if not dry_run:
         conn.commit()
+        logger.info(f"Created {created_count} lead sources")
+    else:
+        logger.info(f"[DRY RUN] Would create {created_count} lead sources")
     
     cursor.close()
     return source_map, created_count
@@ -141,31 +169,18 @@ def link_lead_status_to_sources(conn, source_map: dict, dry_run: bool = True):
     """Link LeadStatus records to lead_sources."""
     cursor = conn.cursor()
     
-    # Use batch update for efficiency
     if not dry_run and source_map:
-        # Build batch update query
-        updates = []
-        for original_source, lead_source_id in source_map.items():
-            normalized_name, _ = normalize_lead_source(original_source)
-            updates.append((lead_source_id, original_source))
-        
-        # Execute in batches
-        batch_size = 100
-        updated_count = 0
-        for i in range(0, len(updates), batch_size):
-            batch = updates[i:i+batch_size]
-            placeholders = ','.join(['%s'] * len(batch))
-            # Use a more efficient update approach
-            for lead_source_id, original_source in batch:
-                cursor.execute("""
-                    UPDATE lead_status
-                    SET lead_source_id = %s, updated_at = NOW()
-                    WHERE referral_source = %s
-                      AND lead_source_id IS NULL
-                """, (lead_source_id, original_source))
-                updated_count += cursor.rowcount
-            if (i // batch_size + 1) % 10 == 0:
-                logger.info(f"Processed {i + len(batch)}/{len(updates)} lead source links...")
+        # One UPDATE joined to a VALUES list instead of one statement per referral source;
+        # a single page keeps cursor.rowcount covering every updated row
+        updates = list(source_map.items())  # (referral_source, lead_source_id)
+        execute_values(cursor, """
+            UPDATE lead_status ls
+            SET lead_source_id = v.lead_source_id, updated_at = NOW()
+            FROM (VALUES %s) AS v(referral_source, lead_source_id)
+            WHERE ls.referral_source = v.referral_source
+              AND ls.lead_source_id IS NULL
+        """, updates, page_size=len(updates))
+        updated_count = cursor.rowcount
     else:
         updated_count = len(source_map)  # Estimate for dry-run
     
@@ -7,15 +7,17 @@ Preserves all records as unique based on quote_number.
 import sys
 from pathlib import Path
 import psycopg2
+from psycopg2 import sql
 import logging
 import time
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set
 from datetime import datetime
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from scripts.utils.database import get_db_connection
+from scripts.utils.database import get_db_connection, estimate_count
 from scripts.utils.script_execution import check_and_log_execution
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,145 +25,238 @@ logger = logging.getLogger(__name__)
 
 SCRIPT_NAME = "rename_and_merge_leads"
 
+# Up to this many source rows are inserted with one set-based statement; above it, in keyset batches
+SINGLE_INSERT_MAX_ROWS = 2_000_000
 
-def rename_leadstatus_to_leads(conn, dry_run: bool = True) -> int:
-    """Rename LeadStatus table to leads."""
-    cursor = conn.cursor()
+# Batch progress is logged every N batches or every N seconds, whichever comes first
+PROGRESS_LOG_BATCHES = 10
+PROGRESS_LOG_SECONDS = 5.0
+
+# quote_number given to a BadLead without one, derived from its id. Evaluated once per row in
+# the INSERT's select list; conflicts are found through the unique index on leads.quote_number.
+BADLEAD_QUOTE_NUMBER_SQL = "'BAD-' || REPLACE(bl.id::text, '-', '')"
+
+# Rows that become new leads; each must expose the source table's primary key as `id`
+BADLEAD_SOURCE_SQL = "SELECT * FROM bad_leads WHERE lead_status_id IS NULL"
+LOSTLEAD_SOURCE_SQL = "SELECT * FROM lost_leads"
+
+# INSERT ... SELECT for new leads; {source} is the relation the rows are read from.
+# ON CONFLICT DO NOTHING skips rows whose id or quote_number is already in leads.
+BADLEAD_INSERT_SQL = f"""
+    INSERT INTO leads (
+        id, quote_number, lead_type,
+        provider, customer_name, customer_email, customer_phone,
+        move_date, date_lead_received, lead_bad_reason,
+        customer_id, lead_source_id,
+        created_at, updated_at
+    )
+    SELECT 
+        bl.id,
+        {BADLEAD_QUOTE_NUMBER_SQL} as quote_number,
+        'BAD'::lead_type,
+        bl.provider,
+        bl.customer_name,
+        bl.customer_email,
+        bl.customer_phone,
+        bl.move_date,
+        bl.date_lead_received,
+        bl.lead_bad_reason,
+        bl.customer_id,
+        bl.lead_source_id,
+        bl.created_at,
+        NOW()
+    FROM {{source}} bl
+    ON CONFLICT DO NOTHING
+"""
+
+LOSTLEAD_INSERT_SQL = """
+    INSERT INTO leads (
+        id, quote_number, lead_type,
+        name, lost_date, move_date, reason,
+        date_received, time_to_first_contact,
+        booked_opportunity_id, lead_source_id,
+        created_at, updated_at
+    )
+    SELECT 
+        ll.id,
+        ll.quote_number,
+        'LOST'::lead_type,
+        ll.name,
+        ll.lost_date,
+        ll.move_date,
+        ll.reason,
+        ll.date_received,
+        ll.time_to_first_contact,
+        ll.booked_opportunity_id,
+        ll.lead_source_id,
+        ll.created_at,
+        NOW()
+    FROM {source} ll
+    ON CONFLICT DO NOTHING
+"""
+
+# One keyset batch: the next `limit` source rows after id `after`, inserted in one statement.
+# Returns the last id seen (NULL once the source is exhausted) and the number inserted.
+KEYSET_BATCH_SQL = """
+    WITH batch AS (
+        SELECT * FROM ({source}) src
+        WHERE %(after)s IS NULL OR src.id > %(after)s
+        ORDER BY src.id
+        LIMIT %(limit)s
+    ),
+    inserted AS (
+        {insert}
+        RETURNING 1
+    )
+    SELECT (SELECT MAX(id) FROM batch), (SELECT COUNT(*) FROM inserted)
+"""
+
+# Sources merged into existing leads (Step 1), in lead_type precedence order:
+# table -> (alias, join condition against leads m, leads it can match,
+#           lead_type it sets, columns it fills when NULL)
+EXISTING_LEAD_SOURCES = {
+    'bad_leads': (
+        'bl', 'bl.lead_status_id = m.id', 'id IN (SELECT lead_status_id FROM bad_leads)', 'BAD',
+        ('provider', 'customer_name', 'customer_email', 'customer_phone', 'move_date',
+         'date_lead_received', 'lead_bad_reason', 'customer_id', 'lead_source_id'),
+    ),
+    'lost_leads': (
+        'll', 'll.quote_number = m.quote_number',
+        'quote_number IN (SELECT quote_number FROM lost_leads)', 'LOST',
+        ('name', 'lost_date', 'move_date', 'reason', 'date_received',
+         'time_to_first_contact', 'booked_opportunity_id', 'lead_source_id'),
+    ),
+}
+
+
+def configure_migration_session(conn) -> None:
+    """
+    Tune a connection's session for the bulk migration.
     
+    synchronous_commit is turned off so the per-batch commits do not wait for
+    the WAL flush. An OS crash right after a commit can lose that transaction.
+    That is acceptable here: the migration is idempotent and can be rerun.
+    The memory settings speed up the sorts, hash joins and index builds
+    the migration does.
+    """
+    cursor = conn.cursor()
     try:
-        # Check if table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'lead_status'
-            )
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
-            logger.info("Table 'lead_status' does not exist, skipping rename")
-            return 0
-        
-        # Check if leads table already exists
         cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'leads'
-            )
+            SET synchronous_commit = off;
+            SET maintenance_work_mem = '1GB';
+            SET work_mem = '256MB'
         """)
-        leads_exists = cursor.fetchone()[0]
-        
-        if leads_exists:
-            logger.warning("Table 'leads' already exists, skipping rename")
-            return 0
-        
-        if dry_run:
-            logger.info("[DRY RUN] Would rename table 'lead_status' to 'leads'")
-            return 1
-        
-        # Rename the table
-        cursor.execute('ALTER TABLE lead_status RENAME TO leads')
         conn.commit()
-        
-        logger.info("Successfully renamed table 'lead_status' to 'leads'")
-        return 1
-    
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error renaming table: {e}")
-        raise
     finally:
         cursor.close()
 
 
-def create_lead_type_enum(conn, dry_run: bool = True) -> bool:
-    """Create lead_type enum if it doesn't exist."""
-    cursor = conn.cursor()
+def load_catalog(conn) -> Dict[str, Set]:
+    """
+    Snapshot the public schema's tables, columns and types in three queries.
+    
+    Every "does X exist" check in this script becomes a set lookup against
+    the snapshot. Steps that change the schema update it as they go.
     
+    Returns:
+        Dict with 'tables' (names), 'columns' ((table, column) pairs) and 'types' (names)
+    """
+    cursor = conn.cursor()
     try:
-        # Check if enum exists
         cursor.execute("""
-            SELECT EXISTS (
-                SELECT 1 FROM pg_type 
-                WHERE typname = 'lead_type'
-            )
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = 'public'
         """)
-        exists = cursor.fetchone()[0]
-        
-        if exists:
-            logger.info("Enum 'lead_type' already exists")
-            return True
+        tables = {row[0] for row in cursor.fetchall()}
         
-        if dry_run:
-            logger.info("[DRY RUN] Would create enum 'lead_type'")
-            return True
-        
-        # Create enum
         cursor.execute("""
-            CREATE TYPE lead_type AS ENUM ('BAD', 'LOST', 'STANDARD')
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
         """)
-        conn.commit()
+        columns = {(row[0], row[1]) for row in cursor.fetchall()}
         
-        logger.info("Successfully created enum 'lead_type'")
-        return True
-    
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error creating enum: {e}")
-        raise
+        cursor.execute("SELECT typname FROM pg_type")
+        types = {row[0] for row in cursor.fetchall()}
+        
+        return {'tables': tables, 'columns': columns, 'types': types}
     finally:
         cursor.close()
 
 
-def add_lead_type_column(conn, dry_run: bool = True) -> bool:
-    """Add lead_type column to leads table."""
+def get_customers_id_type(conn) -> str:
+    """Return the type of customers.id."""
     cursor = conn.cursor()
-    
     try:
-        # Check if column exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT 1 FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'leads' 
-                AND column_name = 'lead_type'
-            )
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if exists:
-            logger.info("Column 'lead_type' already exists in 'leads' table")
-            return True
-        
-        if dry_run:
-            logger.info("[DRY RUN] Would add column 'lead_type' to 'leads' table")
-            return True
-        
-        # Add column with default 'STANDARD' for existing records
+        # format_type gives the DDL spelling of the type (e.g. uuid, text, bigint)
         cursor.execute("""
-            ALTER TABLE leads 
-            ADD COLUMN lead_type lead_type DEFAULT 'STANDARD'
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'customers'::regclass AND attname = 'id' AND NOT attisdropped
         """)
-        conn.commit()
-        
-        logger.info("Successfully added 'lead_type' column to 'leads' table")
-        return True
-    
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error adding column: {e}")
-        raise
+        return cursor.fetchone()[0]
     finally:
         cursor.close()
 
 
-def add_missing_columns_to_leads(conn, dry_run: bool = True) -> int:
-    """Add columns from BadLead and LostLead that don't exist in leads."""
-    cursor = conn.cursor()
-    columns_added = 0
+def rename_leadstatus_to_leads(catalog: Dict[str, Set], dry_run: bool = True) -> List[sql.Composable]:
+    """Plan the rename of the LeadStatus table to leads."""
+    if 'lead_status' not in catalog['tables']:
+        logger.info("Table 'lead_status' does not exist, skipping rename")
+        return []
+    
+    if 'leads' in catalog['tables']:
+        logger.warning("Table 'leads' already exists, skipping rename")
+        return []
+    
+    if dry_run:
+        logger.info("[DRY RUN] Would rename table 'lead_status' to 'leads'")
+        return []
     
+    catalog['tables'].discard('lead_status')
+    catalog['tables'].add('leads')
+    catalog['columns'] = {
+        ('leads' if table == 'lead_status' else table, column)
+        for table, column in catalog['columns']
+    }
+    
+    logger.info("Renaming table 'lead_status' to 'leads'")
+    return [sql.SQL("ALTER TABLE lead_status RENAME TO leads")]
+
+
+def create_lead_type_enum(catalog: Dict[str, Set], dry_run: bool = True) -> List[sql.Composable]:
+    """Plan creation of the lead_type enum if it doesn't exist."""
+    if 'lead_type' in catalog['types']:
+        logger.info("Enum 'lead_type' already exists")
+        return []
+    
+    if dry_run:
+        logger.info("[DRY RUN] Would create enum 'lead_type'")
+        return []
+    
+    catalog['types'].add('lead_type')
+    
+    logger.info("Creating enum 'lead_type'")
+    return [sql.SQL("CREATE TYPE lead_type AS ENUM ('BAD', 'LOST', 'STANDARD')")]
+
+
+def add_lead_type_column(catalog: Dict[str, Set], dry_run: bool = True) -> List[sql.Composable]:
+    """Plan the lead_type column on the leads table."""
+    if ('leads', 'lead_type') in catalog['columns']:
+        logger.info("Column 'lead_type' already exists in 'leads' table")
+        return []
+    
+    if dry_run:
+        logger.info("[DRY RUN] Would add column 'lead_type' to 'leads' table")
+        return []
+    
+    catalog['columns'].add(('leads', 'lead_type'))
+    
+    # Add column with default 'STANDARD' for existing records
+    logger.info("Adding 'lead_type' column to 'leads' table")
+    return [sql.SQL("ALTER TABLE leads ADD COLUMN lead_type lead_type DEFAULT 'STANDARD'")]
+
+
+def add_missing_columns_to_leads(catalog: Dict[str, Set], dry_run: bool = True) -> List[sql.Composable]:
+    """Plan the columns from BadLead and LostLead that don't exist in leads."""
     # Columns to add from BadLead
     badlead_columns = [
         ('provider', 'text'),
@@ -184,436 +279,470 @@ def add_missing_columns_to_leads(conn, dry_run: bool = True) -> int:
     
     all_columns = badlead_columns + lostlead_columns
     
-    try:
-        for column_name, column_type in all_columns:
-            # Check if column exists
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT 1 FROM information_schema.columns 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'leads' 
-                    AND column_name = %s
-                )
-            """, (column_name,))
-            exists = cursor.fetchone()[0]
-            
-            if exists:
-                logger.debug(f"Column '{column_name}' already exists in 'leads' table")
-                continue
-            
-            if dry_run:
-                logger.info(f"[DRY RUN] Would add column '{column_name}' ({column_type}) to 'leads' table")
-                columns_added += 1
-            else:
-                cursor.execute(f"""
-                    ALTER TABLE leads 
-                    ADD COLUMN {column_name} {column_type}
-                """)
-                columns_added += 1
-                logger.info(f"Added column '{column_name}' to 'leads' table")
-        
-        if not dry_run and columns_added > 0:
-            conn.commit()
-        
-        return columns_added
+    missing_columns = [
+        (column_name, column_type) for column_name, column_type in all_columns
+        if ('leads', column_name) not in catalog['columns']
+    ]
+    
+    if not missing_columns:
+        logger.debug("All BadLead/LostLead columns already exist in 'leads' table")
+        return []
+    
+    if dry_run:
+        for column_name, column_type in missing_columns:
+            logger.info(f"[DRY RUN] Would add column '{column_name}' ({column_type}) to 'leads' table")
+        return []
+    
+    for column_name, _ in missing_columns:
+        catalog['columns'].add(('leads', column_name))
+    logger.info(f"Adding columns to 'leads' table: {', '.join(name for name, _ in missing_columns)}")
+    
+    # One ALTER takes the table lock once; IF NOT EXISTS keeps it safe if the snapshot is stale
+    return [sql.SQL("ALTER TABLE leads {}").format(sql.SQL(", ").join(
+        sql.SQL("ADD COLUMN IF NOT EXISTS {} {}").format(
+            sql.Identifier(column_name), sql.SQL(column_type)
+        )
+        for column_name, column_type in missing_columns
+    ))]
+
+
+def execute_setup_statements(conn, statements: List[sql.Composable]) -> None:
+    """Run the planned setup DDL in one round-trip and one transaction."""
+    if not statements:
+        return
     
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql.SQL(";\n").join(statements))
+        conn.commit()
+        logger.info(f"✓ Applied {len(statements)} setup statement(s)")
     except Exception as e:
         conn.rollback()
-        logger.error(f"Error adding columns: {e}")
+        logger.error(f"Error applying setup statements: {e}")
         raise
     finally:
         cursor.close()
 
 
-def migrate_badleads_to_leads(conn, dry_run: bool = True, batch_size: int = 10000) -> int:
-    """Migrate BadLead records to leads table, preserving all quote_numbers."""
-    cursor = conn.cursor()
+def execute_in_autocommit(conn, statement: str) -> None:
+    """
+    Run a statement that cannot run inside a transaction block.
     
+    Used for CREATE INDEX CONCURRENTLY and VACUUM. Any open transaction
+    is committed and the statement runs in autocommit mode.
+    """
+    conn.commit()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
     try:
-        # Check if bad_leads table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'bad_leads'
-            )
-        """)
-        exists = cursor.fetchone()[0]
+        cursor.execute(statement)
+    finally:
+        cursor.close()
+        conn.autocommit = autocommit
+
+
+def insert_in_keyset_batches(conn, cursor, source_sql: str, insert_sql: str,
+                             batch_size: int, total: int) -> int:
+    """
+    Insert source rows into leads in primary-key order, committing each batch.
+    
+    Each batch seeks past the last id of the previous one, so it reads only
+    its own slice of the source table instead of rescanning it from the start.
+    
+    Args:
+        conn: Database connection
+        cursor: Cursor on conn
+        source_sql: Query producing the rows to insert
+        insert_sql: INSERT ... SELECT template with a {source} placeholder
+        batch_size: Rows per batch
+        total: Estimated number of source rows (for progress logging)
+        
+    Returns:
+        Number of rows inserted
+    """
+    query = KEYSET_BATCH_SQL.format(source=source_sql, insert=insert_sql.format(source='batch'))
+    
+    start_time = time.monotonic()
+    last_log = start_time
+    inserted_count = 0
+    batch_num = 0
+    total_batches = (total + batch_size - 1) // batch_size
+    last_id = None
+    log_progress = logger.isEnabledFor(logging.INFO)
+    
+    while True:
+        cursor.execute(query, {'after': last_id, 'limit': batch_size})
+        last_id, batch_inserted = cursor.fetchone()
+        conn.commit()
         
-        if not exists:
+        if last_id is None:
+            break
+        
+        inserted_count += batch_inserted
+        batch_num += 1
+        
+        if not log_progress:
+            continue
+        now = time.monotonic()
+        if batch_num % PROGRESS_LOG_BATCHES == 0 or now - last_log >= PROGRESS_LOG_SECONDS:
+            last_log = now
+            elapsed = now - start_time
+            logger.info("  Batch %d/~%d: Total %s/~%s records inserted "
+                        "(Rate: %.0f records/sec, Elapsed: %.1fs)",
+                        batch_num, total_batches, f"{inserted_count:,}", f"{total:,}",
+                        inserted_count / elapsed if elapsed > 0 else 0, elapsed)
+    
+    return inserted_count
+
+
+def insert_new_leads(conn, cursor, source_table: str, source_sql: str, insert_sql: str,
+                     batch_size: int) -> int:
+    """
+    Insert source rows into leads, in one statement unless the source is large.
+    
+    The size check uses the planner estimate for source_table. The reported
+    count always comes from the INSERT itself, so no COUNT(*) is needed.
+    
+    Source and target live in the same database, so INSERT ... SELECT is used
+    for every size: a COPY TO STDOUT / COPY FROM STDIN round trip would ship
+    every row to the client and back without avoiding any server-side work.
+    
+    Returns:
+        Number of rows inserted
+    """
+    estimated_rows = estimate_count(cursor, source_table)
+    if estimated_rows > SINGLE_INSERT_MAX_ROWS:
+        return insert_in_keyset_batches(conn, cursor, source_sql, insert_sql, batch_size, estimated_rows)
+    
+    cursor.execute(insert_sql.format(source=f"({source_sql})"))
+    inserted_count = cursor.rowcount
+    conn.commit()
+    return inserted_count
+
+
+def prepare_badleads_migration(conn, catalog: Dict[str, Set], dry_run: bool = True) -> int:
+    """
+    Prepare leads and bad_leads for the BadLead migration.
+    
+    Returns:
+        Estimated number of BadLead records to migrate (0 if there is nothing to do)
+    """
+    cursor = conn.cursor()
+    
+    try:
+        if 'bad_leads' not in catalog['tables']:
             logger.info("Table 'bad_leads' does not exist, skipping migration")
             return 0
         
-        # Get count of bad_leads
-        cursor.execute("SELECT COUNT(*) FROM bad_leads")
-        total_badleads = cursor.fetchone()[0]
+        # Planner estimate of bad_leads size; avoids a full scan just for logging
+        total_badleads = estimate_count(cursor, 'bad_leads')
         
         if total_badleads == 0:
             logger.info("No BadLead records to migrate")
             return 0
         
-        logger.info(f"Found {total_badleads:,} BadLead records to migrate")
+        logger.info(f"Found ~{total_badleads:,} BadLead records to migrate (estimate)")
         
         if dry_run:
             logger.info("[DRY RUN] Would migrate BadLead records to leads table")
             return total_badleads
         
         # Ensure customer_id column exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT 1 FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'leads' 
-                AND column_name = 'customer_id'
-            )
-        """)
-        has_customer_id = cursor.fetchone()[0]
-        
-        if not has_customer_id:
+        if ('leads', 'customer_id') not in catalog['columns']:
             logger.info("Adding customer_id column to leads table...")
-            # Check what type customer_id should be (match customers.id type)
-            cursor.execute("""
-                SELECT data_type FROM information_schema.columns 
-                WHERE table_name = 'customers' AND column_name = 'id'
-            """)
-            customer_id_type = cursor.fetchone()[0]
+            # customer_id must match the customers.id type
+            customer_id_type = get_customers_id_type(conn)
             logger.info(f"  customers.id type: {customer_id_type}")
             
             # Add column without foreign key first, then we'll add the constraint after migration
-            cursor.execute(f"""
+            cursor.execute(sql.SQL("""
                 ALTER TABLE leads 
-                ADD COLUMN customer_id {customer_id_type}
-            """)
+                ADD COLUMN customer_id {}
+            """).format(sql.SQL(customer_id_type)))
             conn.commit()
+            catalog['columns'].add(('leads', 'customer_id'))
             logger.info("✓ Added customer_id column (foreign key will be added after migration)")
         
-        start_time = time.time()
-        
-        # Migrate BadLead records
-        # First, we need to generate quote_numbers for BadLeads that don't have them
-        # Since BadLead doesn't have quote_number, we'll need to create unique identifiers
-        # But wait - BadLead has lead_status_id which links to LeadStatus (now leads)
-        # So we should merge BadLead data INTO existing lead records where possible
+        # Index the Step 1 join key; it goes away with bad_leads when the old tables are dropped.
+        # leads.quote_number needs no extra index: its unique index already serves the inserts.
+        execute_in_autocommit(conn, """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tmp_bad_leads_lead_status_id
+            ON bad_leads (lead_status_id) WHERE lead_status_id IS NOT NULL
+        """)
         
-        # Strategy:
-        # 1. For BadLeads with lead_status_id, update the existing lead record
-        # 2. For BadLeads without lead_status_id, create new lead records
+        return total_badleads
+    
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error preparing BadLead migration: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def insert_leads_from_badleads(conn, catalog: Dict[str, Set], batch_size: int = 10000) -> int:
+    """Insert BadLeads without a linked lead as new BAD leads (migration Step 2)."""
+    cursor = conn.cursor()
+    
+    try:
+        if 'bad_leads' not in catalog['tables']:
+            return 0
         
-        # Step 1: Update existing leads that have matching bad_leads
-        logger.info("Step 1: Updating existing leads with BadLead data...")
-        cursor.execute("""
-            SELECT COUNT(*) FROM bad_leads WHERE lead_status_id IS NOT NULL
-        """)
-        linked_count = cursor.fetchone()[0]
-        logger.info(f"  Found {linked_count:,} BadLeads linked to existing leads")
-        
-        if linked_count > 0:
-            cursor.execute("""
-                UPDATE leads l
-                SET 
-                    lead_type = 'BAD',
-                    provider = COALESCE(l.provider, bl.provider),
-                    customer_name = COALESCE(l.customer_name, bl.customer_name),
-                    customer_email = COALESCE(l.customer_email, bl.customer_email),
-                    customer_phone = COALESCE(l.customer_phone, bl.customer_phone),
-                    move_date = COALESCE(l.move_date, bl.move_date),
-                    date_lead_received = COALESCE(l.date_lead_received, bl.date_lead_received),
-                    lead_bad_reason = COALESCE(l.lead_bad_reason, bl.lead_bad_reason),
-                    customer_id = COALESCE(l.customer_id, bl.customer_id),
-                    lead_source_id = COALESCE(l.lead_source_id, bl.lead_source_id),
-                    updated_at = NOW()
-                FROM bad_leads bl
-                WHERE l.id = bl.lead_status_id
-            """)
-            updated_count = cursor.rowcount
-            conn.commit()
-            logger.info(f"  ✓ Updated {updated_count:,} existing lead records")
-        else:
-            updated_count = 0
+        start_time = time.perf_counter()
         
-        # Step 2: Insert new lead records for BadLeads without lead_status_id (BATCH PROCESSING)
-        logger.info("Step 2: Inserting new lead records from BadLeads (batch processing)...")
-        cursor.execute("""
-            SELECT COUNT(*) FROM bad_leads WHERE lead_status_id IS NULL
-        """)
-        unlinked_count = cursor.fetchone()[0]
-        logger.info(f"  Found {unlinked_count:,} BadLeads to insert as new leads")
-        
-        if unlinked_count == 0:
-            logger.info("  No unlinked BadLeads to insert")
-            return updated_count
-        
-        # Process in batches
-        inserted_count = 0
-        batch_num = 0
-        total_batches = (unlinked_count + batch_size - 1) // batch_size
-        
-        while True:
-            batch_start = time.time()
-            cursor.execute("""
-                INSERT INTO leads (
-                    id, quote_number, lead_type,
-                    provider, customer_name, customer_email, customer_phone,
-                    move_date, date_lead_received, lead_bad_reason,
-                    customer_id, lead_source_id,
-                    created_at, updated_at
-                )
-                SELECT 
-                    bl.id,
-                    'BAD-' || REPLACE(bl.id::text, '-', '') as quote_number,
-                    'BAD'::lead_type,
-                    bl.provider,
-                    bl.customer_name,
-                    bl.customer_email,
-                    bl.customer_phone,
-                    bl.move_date,
-                    bl.date_lead_received,
-                    bl.lead_bad_reason,
-                    bl.customer_id,
-                    bl.lead_source_id,
-                    bl.created_at,
-                    NOW()
-                FROM bad_leads bl
-                WHERE bl.lead_status_id IS NULL
-                AND NOT EXISTS (
-                    SELECT 1 FROM leads l WHERE l.quote_number = 'BAD-' || REPLACE(bl.id::text, '-', '')
-                )
-                AND NOT EXISTS (
-                    SELECT 1 FROM leads l WHERE l.id = bl.id
-                )
-                LIMIT %s
-            """, (batch_size,))
-            
-            batch_inserted = cursor.rowcount
-            inserted_count += batch_inserted
-            conn.commit()
-            
-            batch_num += 1
-            batch_time = time.time() - batch_start
-            elapsed = time.time() - start_time
-            rate = inserted_count / elapsed if elapsed > 0 else 0
-            
-            logger.info(f"  Batch {batch_num}/{total_batches}: Inserted {batch_inserted:,} records "
-                       f"(Total: {inserted_count:,}/{unlinked_count:,}, "
-                       f"Rate: {rate:.0f} records/sec, "
-                       f"Elapsed: {elapsed:.1f}s)")
-            
-            if batch_inserted == 0:
-                break
+        # Step 2: Insert new lead records for BadLeads without lead_status_id
+        logger.info("Step 2: Inserting new lead records from BadLeads...")
+        inserted_count = insert_new_leads(
+            conn, cursor, 'bad_leads', BADLEAD_SOURCE_SQL, BADLEAD_INSERT_SQL, batch_size
+        )
         
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         logger.info(f"✓ Completed BadLead migration: {inserted_count:,} records inserted in {total_time:.1f}s")
-        return updated_count + inserted_count
+        return inserted_count
     
     except Exception as e:
         conn.rollback()
-        logger.error(f"Error migrating BadLeads: {e}")
+        logger.error(f"Error inserting BadLeads: {e}")
         raise
     finally:
         cursor.close()
 
 
-def migrate_lostleads_to_leads(conn, dry_run: bool = True, batch_size: int = 10000) -> int:
-    """Migrate LostLead records to leads table, preserving all quote_numbers."""
+def prepare_lostleads_migration(conn, catalog: Dict[str, Set], dry_run: bool = True) -> int:
+    """
+    Prepare lost_leads for the LostLead migration.
+    
+    Returns:
+        Estimated number of LostLead records to migrate (0 if there is nothing to do)
+    """
     cursor = conn.cursor()
     
     try:
-        # Check if lost_leads table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'lost_leads'
-            )
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
+        if 'lost_leads' not in catalog['tables']:
             logger.info("Table 'lost_leads' does not exist, skipping migration")
             return 0
         
-        # Get count of lost_leads
-        cursor.execute("SELECT COUNT(*) FROM lost_leads")
-        total_lostleads = cursor.fetchone()[0]
+        # Planner estimate of lost_leads size; avoids a full scan just for logging
+        total_lostleads = estimate_count(cursor, 'lost_leads')
         
         if total_lostleads == 0:
             logger.info("No LostLead records to migrate")
             return 0
         
-        logger.info(f"Found {total_lostleads:,} LostLead records to migrate")
+        logger.info(f"Found ~{total_lostleads:,} LostLead records to migrate (estimate)")
         
         if dry_run:
             logger.info("[DRY RUN] Would migrate LostLead records to leads table")
             return total_lostleads
         
-        start_time = time.time()
+        # Index the Step 1 join key; it goes away with lost_leads when the old tables are dropped
+        execute_in_autocommit(conn, """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS tmp_lost_leads_quote_number
+            ON lost_leads (quote_number)
+        """)
+        
+        return total_lostleads
+    
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error preparing LostLead migration: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def insert_leads_from_lostleads(conn, catalog: Dict[str, Set], batch_size: int = 10000) -> int:
+    """Insert LostLeads whose quote_number is not in leads as new LOST leads (migration Step 2)."""
+    cursor = conn.cursor()
+    
+    try:
+        if 'lost_leads' not in catalog['tables']:
+            return 0
         
-        # Migrate LostLead records
-        # Strategy: Use quote_number to match or insert
-        # If quote_number exists in leads, update it
-        # If quote_number doesn't exist, insert new record
+        start_time = time.perf_counter()
         
-        # Step 1: Update existing leads that have matching quote_numbers
-        cursor.execute("""
-            UPDATE leads l
-            SET 
-                lead_type = CASE 
-                    WHEN l.lead_type = 'BAD'::lead_type THEN 'BAD'::lead_type  -- Keep BAD if already set
-                    ELSE 'LOST'::lead_type
-                END,
-                name = COALESCE(l.name, ll.name),
-                lost_date = COALESCE(l.lost_date, ll.lost_date),
-                move_date = COALESCE(l.move_date, ll.move_date),
-                reason = COALESCE(l.reason, ll.reason),
-                date_received = COALESCE(l.date_received, ll.date_received),
-                time_to_first_contact = COALESCE(l.time_to_first_contact, ll.time_to_first_contact),
-                booked_opportunity_id = COALESCE(l.booked_opportunity_id, ll.booked_opportunity_id),
-                lead_source_id = COALESCE(l.lead_source_id, ll.lead_source_id),
-                updated_at = NOW()
-            FROM lost_leads ll
-            WHERE l.quote_number = ll.quote_number
-        """)
-        updated_count = cursor.rowcount
-        logger.info(f"Updated {updated_count} existing lead records with LostLead data")
-        
-        # Step 2: Insert new lead records for LostLeads with quote_numbers not in leads (BATCH PROCESSING)
-        logger.info("Inserting LostLead records (batch processing)...")
-        
-        inserted_count = 0
-        batch_num = 0
-        total_batches = (total_lostleads + batch_size - 1) // batch_size
-        
-        while True:
-            batch_start = time.time()
-            cursor.execute("""
-                INSERT INTO leads (
-                    id, quote_number, lead_type,
-                    name, lost_date, move_date, reason,
-                    date_received, time_to_first_contact,
-                    booked_opportunity_id, lead_source_id,
-                    created_at, updated_at
-                )
-                SELECT 
-                    ll.id,
-                    ll.quote_number,
-                    'LOST'::lead_type,
-                    ll.name,
-                    ll.lost_date,
-                    ll.move_date,
-                    ll.reason,
-                    ll.date_received,
-                    ll.time_to_first_contact,
-                    ll.booked_opportunity_id,
-                    ll.lead_source_id,
-                    ll.created_at,
-                    NOW()
-                FROM lost_leads ll
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM leads l WHERE l.quote_number = ll.quote_number
-                )
-                AND NOT EXISTS (
-                    SELECT 1 FROM leads l WHERE l.id = ll.id
-                )
-                LIMIT %s
-            """, (batch_size,))
-            
-            batch_inserted = cursor.rowcount
-            inserted_count += batch_inserted
-            conn.commit()
-            
-            batch_num += 1
-            batch_time = time.time() - batch_start
-            elapsed = time.time() - start_time
-            rate = inserted_count / elapsed if elapsed > 0 else 0
-            
-            logger.info(f"  Batch {batch_num}/{total_batches}: Inserted {batch_inserted:,} records "
-                       f"(Total: {inserted_count:,}/{total_lostleads:,}, "
-                       f"Rate: {rate:.0f} records/sec, "
-                       f"Elapsed: {elapsed:.1f}s)")
-            
-            if batch_inserted == 0:
-                break
+        # Step 2: Insert new lead records for LostLeads with quote_numbers not in leads
+        logger.info("Inserting LostLead records...")
+        inserted_count = insert_new_leads(
+            conn, cursor, 'lost_leads', LOSTLEAD_SOURCE_SQL, LOSTLEAD_INSERT_SQL, batch_size
+        )
         
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         logger.info(f"✓ Completed LostLead migration: {inserted_count:,} records inserted in {total_time:.1f}s")
-        return updated_count + inserted_count
+        return inserted_count
     
     except Exception as e:
         conn.rollback()
-        logger.error(f"Error migrating LostLeads: {e}")
+        logger.error(f"Error inserting LostLeads: {e}")
         raise
     finally:
         cursor.close()
 
 
-def update_foreign_key_references(conn, dry_run: bool = True) -> int:
-    """Update foreign key references from bad_leads.lead_status_id to point to leads."""
+def build_existing_leads_update(source_tables: List[str]) -> sql.Composed:
+    """
+    Build the Step 1 UPDATE that merges the given source tables into the leads they match.
+    
+    The join is driven from the candidate leads each source can match (one UNION
+    branch per source), so only those leads are joined and checked, not all of leads.
+    """
+    candidates, joins, lead_type_cases, needs_update, assignments, returning, counts = [], [], [], [], [], [], []
+    fill_aliases: Dict[str, List[str]] = {}
+    precedence: List[str] = []
+    
+    for table, (alias, join_condition, candidate, lead_type, columns) in EXISTING_LEAD_SOURCES.items():
+        # Types earlier in EXISTING_LEAD_SOURCES are never overwritten (BAD is kept over LOST)
+        higher_types = list(precedence)
+        precedence.append(lead_type)
+        if table not in source_tables:
+            continue
+        
+        source_id = sql.Identifier(alias, 'id')
+        candidates.append(sql.SQL("SELECT id, quote_number FROM leads WHERE {}").format(sql.SQL(candidate)))
+        joins.append(sql.SQL("LEFT JOIN {} {} ON {}").format(
+            sql.Identifier(table), sql.Identifier(alias), sql.SQL(join_condition)
+        ))
+        
+        matched = [sql.SQL("{} IS NOT NULL").format(source_id)]
+        matched += [
+            sql.SQL("l.lead_type IS DISTINCT FROM {}::lead_type").format(sql.Literal(higher))
+            for higher in higher_types
+        ]
+        lead_type_cases.append(sql.SQL("WHEN {} THEN {}::lead_type").format(
+            sql.SQL(" AND ").join(matched), sql.Literal(lead_type)
+        ))
+        
+        # Skip rows the update would leave unchanged
+        matched.append(sql.SQL("l.lead_type IS DISTINCT FROM {}::lead_type").format(sql.Literal(lead_type)))
+        needs_update.append(sql.SQL("({})").format(sql.SQL(" AND ").join(matched)))
+        for column in columns:
+            fill_aliases.setdefault(column, []).append(alias)
+            needs_update.append(sql.SQL("({} IS NULL AND {} IS NOT NULL)").format(
+                sql.Identifier('l', column), sql.Identifier(alias, column)
+            ))
+        
+        returning.append(sql.SQL("{} IS NOT NULL AS {}").format(source_id, sql.Identifier(table)))
+        counts.append(sql.SQL("COUNT(*) FILTER (WHERE {})").format(sql.Identifier(table)))
+    
+    # Each column keeps its value and is otherwise filled from the first source that has one
+    for column, aliases in fill_aliases.items():
+        assignments.append(sql.SQL("{} = COALESCE({})").format(
+            sql.Identifier(column),
+            sql.SQL(", ").join(sql.Identifier(alias, column) for alias in ['l'] + aliases),
+        ))
+    
+    return sql.SQL("""
+        WITH updated AS (
+            UPDATE leads l
+            SET
+                lead_type = CASE {lead_type_cases} ELSE l.lead_type END,
+                {assignments},
+                updated_at = NOW()
+            FROM ({candidates}) m
+            {joins}
+            WHERE m.id = l.id
+              AND ({needs_update})
+            RETURNING {returning}
+        )
+        SELECT {counts} FROM updated
+    """).format(
+        candidates=sql.SQL("\n                UNION\n                ").join(candidates),
+        lead_type_cases=sql.SQL(" ").join(lead_type_cases),
+        assignments=sql.SQL(",\n                ").join(assignments),
+        joins=sql.SQL("\n            ").join(joins),
+        needs_update=sql.SQL("\n                OR ").join(needs_update),
+        returning=sql.SQL(", ").join(returning),
+        counts=sql.SQL(", ").join(counts),
+    )
+
+
+def update_existing_leads(conn, source_tables: List[str]) -> Dict[str, int]:
+    """
+    Merge BadLead and LostLead data into the leads they match (migration Step 1).
+    
+    Both sources are LEFT JOINed in a single UPDATE, so a lead matched by a BadLead
+    and a LostLead is planned, scanned and written once.
+    
+    Args:
+        source_tables: Source tables with rows to merge ('bad_leads', 'lost_leads')
+    
+    Returns:
+        Number of updated leads matched by each source table
+    """
     cursor = conn.cursor()
-    updates = 0
     
     try:
-        # Check if bad_leads table still exists and has lead_status_id
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT 1 FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'bad_leads' 
-                AND column_name = 'lead_status_id'
-            )
-        """)
-        has_column = cursor.fetchone()[0] if cursor.rowcount > 0 else False
+        source_tables = [table for table in EXISTING_LEAD_SOURCES if table in source_tables]
+        if not source_tables:
+            return {}
         
-        if not has_column:
-            logger.info("bad_leads.lead_status_id column doesn't exist or table is gone")
-            return 0
+        logger.info("Step 1: Updating existing leads with BadLead and LostLead data...")
+        cursor.execute(build_existing_leads_update(source_tables))
+        updated = dict(zip(source_tables, cursor.fetchone()))
+        conn.commit()
         
-        # The foreign key should already point to the renamed table
-        # But we need to update the constraint name if it references lead_status
-        # Actually, PostgreSQL should handle this automatically when we rename the table
-        # So this might not be needed, but let's check
+        for table, updated_count in updated.items():
+            logger.info(f"  ✓ Updated {updated_count:,} existing lead records from {table}")
         
-        logger.info("Foreign key references should be automatically updated by table rename")
-        return 0
+        return updated
     
     except Exception as e:
-        logger.warning(f"Error updating foreign keys: {e}")
-        return 0
+        conn.rollback()
+        logger.error(f"Error updating existing leads: {e}")
+        raise
     finally:
         cursor.close()
 
 
-def drop_old_tables(conn, dry_run: bool = True) -> int:
+def update_foreign_key_references(conn, catalog: Dict[str, Set], dry_run: bool = True) -> int:
+    """Update foreign key references from bad_leads.lead_status_id to point to leads."""
+    if ('bad_leads', 'lead_status_id') not in catalog['columns']:
+        logger.info("bad_leads.lead_status_id column doesn't exist or table is gone")
+        return 0
+    
+    # The foreign key should already point to the renamed table
+    # But we need to update the constraint name if it references lead_status
+    # Actually, PostgreSQL should handle this automatically when we rename the table
+    # So this might not be needed, but let's check
+    
+    logger.info("Foreign key references should be automatically updated by table rename")
+    return 0
+
+
+def drop_old_tables(conn, catalog: Dict[str, Set], dry_run: bool = True) -> int:
     """Drop BadLead and LostLead tables after migration."""
     cursor = conn.cursor()
-    dropped = 0
     
     try:
-        tables_to_drop = ['bad_leads', 'lost_leads']
+        tables_to_drop = [
+            table_name for table_name in ('bad_leads', 'lost_leads')
+            if table_name in catalog['tables']
+        ]
         
-        for table_name in tables_to_drop:
-            cursor.execute(f"""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = '{table_name}'
-                )
-            """)
-            exists = cursor.fetchone()[0]
-            
-            if not exists:
-                logger.info(f"Table '{table_name}' does not exist, skipping")
-                continue
-            
-            if dry_run:
+        if not tables_to_drop:
+            logger.info("Tables 'bad_leads' and 'lost_leads' do not exist, skipping")
+            return 0
+        
+        if dry_run:
+            for table_name in tables_to_drop:
                 logger.info(f"[DRY RUN] Would drop table '{table_name}'")
-                dropped += 1
-            else:
-                cursor.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE")
-                dropped += 1
-                logger.info(f"Dropped table '{table_name}'")
+            return len(tables_to_drop)
         
-        if not dry_run and dropped > 0:
-            conn.commit()
+        # One statement drops both tables in a single lock sweep
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(
+            sql.SQL(", ").join(sql.Identifier(table_name) for table_name in tables_to_drop)
+        ))
+        conn.commit()
+        dropped = len(tables_to_drop)
+        
+        for table_name in tables_to_drop:
+            catalog['tables'].discard(table_name)
+            logger.info(f"Dropped table '{table_name}'")
+        
+        # Reclaim the dead tuples left in leads by the Step 1 update and refresh its stats
+        execute_in_autocommit(conn, "VACUUM ANALYZE leads")
+        logger.info("✓ Vacuumed and analyzed leads")
         
         return dropped
     
@@ -656,70 +785,138 @@ def main():
         if dry_run:
             logger.info("DRY RUN MODE - No changes will be made")
         
+        if not dry_run:
+            configure_migration_session(conn)
+        
+        # One catalog snapshot replaces the per-step existence probes
+        catalog = load_catalog(conn)
+        
+        # Steps 1-4 only plan their DDL; it is applied together in one round-trip
+        setup_statements = []
+        
         # Step 1: Rename LeadStatus to leads
         logger.info("\nStep 1: Renaming LeadStatus to leads...")
-        rename_leadstatus_to_leads(conn, dry_run)
+        setup_statements += rename_leadstatus_to_leads(catalog, dry_run)
         
         # Step 2: Create lead_type enum
         logger.info("\nStep 2: Creating lead_type enum...")
-        create_lead_type_enum(conn, dry_run)
+        setup_statements += create_lead_type_enum(catalog, dry_run)
         
         # Step 3: Add lead_type column
         logger.info("\nStep 3: Adding lead_type column...")
-        add_lead_type_column(conn, dry_run)
+        setup_statements += add_lead_type_column(catalog, dry_run)
         
         # Step 4: Add missing columns from BadLead/LostLead
         logger.info("\nStep 4: Adding missing columns to leads table...")
-        add_missing_columns_to_leads(conn, dry_run)
+        setup_statements += add_missing_columns_to_leads(catalog, dry_run)
+        
+        execute_setup_statements(conn, setup_statements)
         
-        # Step 5: Migrate BadLead records
-        logger.info("\nStep 5: Migrating BadLead records...")
-        badlead_count = migrate_badleads_to_leads(conn, dry_run, batch_size=10000)
+        logger.info("\nStep 5: Preparing BadLead migration...")
+        badlead_count = prepare_badleads_migration(conn, catalog, dry_run)
         
-        # Step 6: Migrate LostLead records
         logger.info("")
-        logger.info("Step 6: Migrating LostLead records...")
-        lostlead_count = migrate_lostleads_to_leads(conn, dry_run, batch_size=10000)
+        logger.info("Step 6: Preparing LostLead migration...")
+        lostlead_count = prepare_lostleads_migration(conn, catalog, dry_run)
         
+        if not dry_run:
+            source_tables = [
+                table_name for table_name, count in
+                (('bad_leads', badlead_count), ('lost_leads', lostlead_count)) if count
+            ]
+            
+            # Existing leads are updated by one statement that reads both sources
+            logger.info("")
+            updated = update_existing_leads(conn, source_tables)
+            badlead_count = updated.get('bad_leads', 0)
+            lostlead_count = updated.get('lost_leads', 0)
+            
+            if len(source_tables) == 2:
+                # The inserts touch disjoint ids and quote_numbers and run concurrently;
+                # the LostLead insert gets its own connection
+                logger.info("")
+                logger.info("Inserting new leads from BadLeads and LostLeads concurrently...")
+                lostlead_conn = get_db_connection()
+                try:
+                    configure_migration_session(lostlead_conn)
+                    with ThreadPoolExecutor(max_workers=2) as executor:
+                        futures = {
+                            'bad_leads': executor.submit(insert_leads_from_badleads, conn, catalog, 10000),
+                            'lost_leads': executor.submit(insert_leads_from_lostleads, lostlead_conn, catalog, 10000),
+                        }
+                        inserted = {table_name: future.result() for table_name, future in futures.items()}
+                finally:
+                    lostlead_conn.close()
+            else:
+                # At most one source to insert from: no second connection needed
+                inserters = {'bad_leads': insert_leads_from_badleads, 'lost_leads': insert_leads_from_lostleads}
+                inserted = {
+                    table_name: inserters[table_name](conn, catalog, 10000)
+                    for table_name in source_tables
+                }
+            badlead_count += inserted.get('bad_leads', 0)
+            lostlead_count += inserted.get('lost_leads', 0)
+
+            # leads may have grown by millions of rows; refresh its statistics so the
+            # foreign key validation and later steps are planned against its real size
+            if source_tables:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("ANALYZE leads")
+                    conn.commit()
+                    logger.info("✓ Analyzed leads")
+                finally:
+                    cursor.close()
+
         # Step 7: Add foreign key constraint for customer_id if it doesn't exist
         if not dry_run:
             logger.info("")
             logger.info("Step 7: Adding foreign key constraint for customer_id...")
             cursor = conn.cursor()
             try:
+                # NOT VALID holds the ACCESS EXCLUSIVE lock only for the catalog change;
+                # VALIDATE then checks existing rows under a SHARE UPDATE EXCLUSIVE lock,
+                # which does not block reads or writes on leads. An existing constraint
+                # raises duplicate_object, which the DO block swallows, and validating an
+                # already valid constraint is a no-op.
                 cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.table_constraints 
-                        WHERE table_name = 'leads' 
-                        AND constraint_name = 'leads_customer_id_fkey'
-                    )
-                """)
-                fk_exists = cursor.fetchone()[0]
-                
-                if not fk_exists:
-                    cursor.execute("""
-                        ALTER TABLE leads 
-                        ADD CONSTRAINT leads_customer_id_fkey 
+                    DO $$
+                    BEGIN
+                        ALTER TABLE leads
+                        ADD CONSTRAINT leads_customer_id_fkey
                         FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE SET NULL
-                    """)
-                    conn.commit()
-                    logger.info("✓ Added foreign key constraint for customer_id")
-                else:
-                    logger.info("Foreign key constraint already exists")
+                        NOT VALID;
+                    EXCEPTION WHEN duplicate_object THEN
+                        NULL;
+                    END $$
+                """)
+                conn.commit()
             except Exception as e:
                 logger.warning(f"Could not add foreign key constraint: {e}")
                 conn.rollback()
+            else:
+                # The NOT VALID constraint is committed at this point, so a failed
+                # validation leaves it in place, enforced for new rows only
+                try:
+                    cursor.execute("ALTER TABLE leads VALIDATE CONSTRAINT leads_customer_id_fkey")
+                    conn.commit()
+                    logger.info("✓ Foreign key constraint for customer_id is in place")
+                except Exception as e:
+                    logger.warning(f"Foreign key constraint leads_customer_id_fkey exists but is NOT VALID: "
+                                   f"existing leads failed validation ({e}). Fix orphaned customer_id values "
+                                   f"and run: ALTER TABLE leads VALIDATE CONSTRAINT leads_customer_id_fkey")
+                    conn.rollback()
             finally:
                 cursor.close()
         
         # Step 7: Update foreign key references
         logger.info("\nStep 7: Updating foreign key references...")
-        update_foreign_key_references(conn, dry_run)
+        update_foreign_key_references(conn, catalog, dry_run)
         
         # Step 8: Drop old tables (only if not dry run)
         if not dry_run:
             logger.info("\nStep 8: Dropping old tables...")
-            drop_old_tables(conn, dry_run)
+            drop_old_tables(conn, catalog, dry_run)
         
         logger.info("\n" + "="*80)
         logger.info("SUMMARY")
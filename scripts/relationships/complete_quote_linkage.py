@@ -8,6 +8,7 @@ The triggers will automatically link records on insert/update.
 This script is kept for backfilling existing NULL relationships.
 """
 
+import argparse
 import sys
 from pathlib import Path
 import psycopg2
@@ -17,71 +18,137 @@ import logging
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from scripts.utils.database import get_db_connection
-from scripts.utils.script_execution import check_and_log_execution
+from scripts.utils.database import get_db_connection, estimate_query_rows, warn_missing_indexes
+from scripts.utils.script_execution import (
+    check_and_log_execution, release_script_lock, try_acquire_script_lock
+)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 SCRIPT_NAME = "complete_quote_linkage"
 
+# Partial indexes over the rows still to be linked, created by PARTIAL_INDEX_MIGRATION
+PARTIAL_INDEX_MIGRATION = "sql/migrations/20250102000000_partial_indexes_for_relationship_backfills.sql"
+PARTIAL_INDEXES = (
+    'idx_lead_status_unlinked_quote_number',
+    'idx_lost_leads_unlinked_quote_number',
+)
 
-def link_lead_status_to_booked_opportunities(conn, dry_run: bool = True):
-    """Link LeadStatus records to BookedOpportunities via quote_number."""
-    cursor = conn.cursor()
+# Records each backfill would link; EXPLAINed for the dry-run estimates
+UNLINKED_MATCH_QUERIES = {
+    'lead_status': """
+        SELECT 1
+        FROM lead_status ls
+        JOIN booked_opportunities bo ON bo.quote_number = ls.quote_number
+        WHERE ls.booked_opportunity_id IS NULL
+          AND ls.quote_number IS NOT NULL
+    """,
+    'lost_leads': """
+        SELECT 1
+        FROM lost_leads ll
+        JOIN booked_opportunities bo ON bo.quote_number = ll.quote_number
+        WHERE ll.booked_opportunity_id IS NULL
+          AND ll.quote_number IS NOT NULL
+    """,
+}
+
+
+def positive_int(value: str) -> int:
+    """argparse type for options that must be a positive integer."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def link_all(conn, dry_run: bool = True, batch_size: int = 10000):
+    """
+    Link LeadStatus and LostLead records to BookedOpportunities via quote_number.
     
-    # Find LeadStatus records without booked_opportunity_id but with matching quote_number
-    cursor.execute("""
-        UPDATE lead_status ls
-        SET booked_opportunity_id = bo.id,
-            updated_at = NOW()
-        FROM booked_opportunities bo
-        WHERE ls.quote_number = bo.quote_number
-          AND ls.booked_opportunity_id IS NULL
-    """)
+    Both backfills run as data-modifying CTEs of one statement, so each batch
+    links up to batch_size records of each table in one round-trip. Committing
+    per batch keeps row locks and WAL bursts bounded on large backfills.
+    In dry-run mode nothing is updated and the counts are planner estimates.
     
-    updated_count = cursor.rowcount
+    Returns:
+        Tuple of (LeadStatus records linked, LostLead records linked)
+    """
+    if batch_size < 1:
+        # LIMIT 0 would link nothing and never finish; a negative LIMIT is an error
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
     
-    if not dry_run:
-        conn.commit()
-        logger.info(f"Linked {updated_count} LeadStatus records to BookedOpportunities")
-    else:
-        logger.info(f"[DRY RUN] Would link {updated_count} LeadStatus records to BookedOpportunities")
-    
-    cursor.close()
-    return updated_count
-
-
-def link_lost_leads_to_booked_opportunities(conn, dry_run: bool = True):
-    """Link LostLead records to BookedOpportunities via quote_number."""
     cursor = conn.cursor()
     
-    # Find LostLead records without booked_opportunity_id but with matching quote_number
-    cursor.execute("""
-        UPDATE lost_leads ll
-        SET booked_opportunity_id = bo.id,
-            updated_at = NOW()
-        FROM booked_opportunities bo
-        WHERE ll.quote_number = bo.quote_number
-          AND ll.booked_opportunity_id IS NULL
-    """)
+    if dry_run:
+        # Planner estimates instead of running and rolling back the whole backfill
+        ls_count = estimate_query_rows(cursor, UNLINKED_MATCH_QUERIES['lead_status'])
+        ll_count = estimate_query_rows(cursor, UNLINKED_MATCH_QUERIES['lost_leads'])
+        conn.rollback()
+        logger.info(f"[DRY RUN] Would link ~{ls_count} LeadStatus records to BookedOpportunities (planner estimate)")
+        logger.info(f"[DRY RUN] Would link ~{ll_count} LostLead records to BookedOpportunities (planner estimate)")
+        cursor.close()
+        return ls_count, ll_count
     
-    updated_count = cursor.rowcount
+    ls_count = ll_count = 0
     
-    if not dry_run:
+    while True:
+        # Next batch of records without booked_opportunity_id but with a matching quote_number;
+        # booked_opportunities.quote_number is unique, so each record joins at most one row
+        cursor.execute("""
+            WITH ls_batch AS (
+                SELECT ls.id, bo.id AS bo_id
+                FROM lead_status ls
+                JOIN booked_opportunities bo ON bo.quote_number = ls.quote_number
+                WHERE ls.booked_opportunity_id IS NULL
+                  AND ls.quote_number IS NOT NULL
+                LIMIT %(limit)s
+            ),
+            ll_batch AS (
+                SELECT ll.id, bo.id AS bo_id
+                FROM lost_leads ll
+                JOIN booked_opportunities bo ON bo.quote_number = ll.quote_number
+                WHERE ll.booked_opportunity_id IS NULL
+                  AND ll.quote_number IS NOT NULL
+                LIMIT %(limit)s
+            ),
+            ls_upd AS (
+                UPDATE lead_status ls
+                SET booked_opportunity_id = b.bo_id,
+                    updated_at = NOW()
+                FROM ls_batch b
+                WHERE ls.id = b.id
+                RETURNING 1
+            ),
+            ll_upd AS (
+                UPDATE lost_leads ll
+                SET booked_opportunity_id = b.bo_id,
+                    updated_at = NOW()
+                FROM ll_batch b
+                WHERE ll.id = b.id
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM ls_upd), (SELECT COUNT(*) FROM ll_upd)
+        """, {'limit': batch_size})
+        ls_batch_count, ll_batch_count = cursor.fetchone()
+        ls_count += ls_batch_count
+        ll_count += ll_batch_count
+        
         conn.commit()
-        logger.info(f"Linked {updated_count} LostLead records to BookedOpportunities")
-    else:
-        logger.info(f"[DRY RUN] Would link {updated_count} LostLead records to BookedOpportunities")
+        logger.debug(f"Batch linked {ls_batch_count} LeadStatus and {ll_batch_count} LostLead records")
+        
+        if ls_batch_count < batch_size and ll_batch_count < batch_size:
+            break
+    
+    logger.info(f"Linked {ls_count} LeadStatus records to BookedOpportunities")
+    logger.info(f"Linked {ll_count} LostLead records to BookedOpportunities")
     
     cursor.close()
-    return updated_count
+    return ls_count, ll_count
 
 
 def main():
     """Main linking function."""
-    import argparse
-    
     parser = argparse.ArgumentParser(description='Complete quote_number linkage')
     parser.add_argument('--dry-run', action='store_true', default=True,
                        help='Run in dry-run mode (default: True)')
@@ -89,6 +156,10 @@ def main():
                        help='Execute the updates (overrides dry-run)')
     parser.add_argument('--force', action='store_true',
                        help='Force execution even if already run')
+    parser.add_argument('--batch-size', type=positive_int, default=10000,
+                       help='Records of each table linked per transaction (default: 10000)')
+    parser.add_argument('--analyze', action=argparse.BooleanOptionalAction, default=True,
+                       help='ANALYZE the linked tables before linking (default: True)')
     
     args = parser.parse_args()
     dry_run = not args.execute
@@ -99,45 +170,66 @@ def main():
         logger.info("EXECUTING updates to database.")
     
     conn = get_db_connection()
+    locked = False
     try:
+        # Exit right away if another run is already working (one round-trip, no table writes)
+        locked = try_acquire_script_lock(conn, SCRIPT_NAME)
+        if not locked:
+            logger.info("Another run of this script is in progress. Exiting.")
+            return 0
+        
         # Check if script should run (idempotency check)
         if not dry_run and not check_and_log_execution(conn, SCRIPT_NAME, force=args.force, 
                                                       notes="Backfill existing NULL relationships"):
             return 0
         
-        # Check if there's any work to do
+        warn_missing_indexes(conn, PARTIAL_INDEXES, PARTIAL_INDEX_MIGRATION)
+        
+        # Check if there's any work to do; EXISTS stops at the first unlinked record,
+        # so an already clean database (the usual case with the triggers) costs no scan
         cursor = conn.cursor()
         cursor.execute("""
             SELECT 
-                (SELECT COUNT(*) FROM lead_status WHERE booked_opportunity_id IS NULL AND quote_number IS NOT NULL) as ls_unlinked,
-                (SELECT COUNT(*) FROM lost_leads WHERE booked_opportunity_id IS NULL AND quote_number IS NOT NULL) as ll_unlinked
+                EXISTS (SELECT 1 FROM lead_status WHERE booked_opportunity_id IS NULL AND quote_number IS NOT NULL) as ls_unlinked,
+                EXISTS (SELECT 1 FROM lost_leads WHERE booked_opportunity_id IS NULL AND quote_number IS NOT NULL) as ll_unlinked
         """)
-        result = cursor.fetchone()
+        ls_unlinked, ll_unlinked = cursor.fetchone()
         cursor.close()
         
-        ls_unlinked = result[0] if result else 0
-        ll_unlinked = result[1] if result else 0
-        
-        if ls_unlinked == 0 and ll_unlinked == 0:
+        if not ls_unlinked and not ll_unlinked:
             logger.info("No unlinked records found. All relationships are already established.")
             logger.info("NOTE: Database triggers will automatically link new records going forward.")
             return 0
         
-        logger.info(f"Found {ls_unlinked} unlinked LeadStatus records and {ll_unlinked} unlinked LostLead records")
+        unlinked_tables = [name for name, unlinked in (("LeadStatus", ls_unlinked), ("LostLead", ll_unlinked)) if unlinked]
+        logger.info(f"Found unlinked {' and '.join(unlinked_tables)} records")
+        
+        if args.analyze:
+            # Fresh statistics keep the planner on the partial and quote_number indexes
+            # after the tables have grown
+            logger.info("Analyzing lead_status, lost_leads and booked_opportunities...")
+            cursor = conn.cursor()
+            cursor.execute("ANALYZE lead_status, lost_leads, booked_opportunities")
+            conn.commit()
+            cursor.close()
         
-        logger.info("Linking LeadStatus to BookedOpportunities...")
-        ls_count = link_lead_status_to_booked_opportunities(conn, dry_run=dry_run)
+        logger.info("Linking LeadStatus and LostLead to BookedOpportunities...")
+        ls_count, ll_count = link_all(conn, dry_run=dry_run, batch_size=args.batch_size)
         
-        logger.info("Linking LostLead to BookedOpportunities...")
-        ll_count = link_lost_leads_to_booked_opportunities(conn, dry_run=dry_run)
+        # Dry-run counts are planner estimates
+        approx, note = ("~", " (planner estimate)") if dry_run else ("", "")
         
-        print("\n" + "="*80)
-        print("QUOTE NUMBER LINKAGE SUMMARY")
-        print("="*80)
-        print(f"LeadStatus records linked: {ls_count}")
-        print(f"LostLead records linked: {ll_count}")
-        print(f"Total records linked: {ls_count + ll_count}")
-        print("="*80 + "\n")
+        # Written in one call so the banner is not interleaved with other output
+        sys.stdout.write(
+            "\n" + "="*80 + "\n"
+            "QUOTE NUMBER LINKAGE SUMMARY\n"
+            + "="*80 + "\n"
+            f"LeadStatus records linked: {approx}{ls_count}{note}\n"
+            f"LostLead records linked: {approx}{ll_count}{note}\n"
+            f"Total records linked: {approx}{ls_count + ll_count}{note}\n"
+            + "="*80 + "\n\n"
+        )
+        sys.stdout.flush()
         
         if not dry_run:
             logger.info("NOTE: Database triggers will automatically link new records going forward.")
@@ -155,6 +247,8 @@ def main():
         conn.rollback()
         return 1
     finally:
+        if locked:
+            release_script_lock(conn, SCRIPT_NAME)
         conn.close()
 
 
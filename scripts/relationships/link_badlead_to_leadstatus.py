@@ -11,13 +11,15 @@ This script is kept for backfilling existing NULL relationships.
 import sys
 from pathlib import Path
 import psycopg2
+from psycopg2 import sql
 from datetime import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Add scripts directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from scripts.utils.database import get_db_connection
+from scripts.utils.database import get_db_connection, warn_missing_indexes
 from scripts.utils.script_execution import check_and_log_execution
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,104 +27,144 @@ logger = logging.getLogger(__name__)
 
 SCRIPT_NAME = "link_badlead_to_leadstatus"
 
+# Partial indexes over the rows still to be linked, created by PARTIAL_INDEX_MIGRATION
+PARTIAL_INDEX_MIGRATION = "sql/migrations/20250102000000_partial_indexes_for_relationship_backfills.sql"
+PARTIAL_INDEXES = (
+    'idx_bad_leads_unlinked_customer_email',
+    'idx_bad_leads_unlinked_customer_phone',
+    'idx_bad_leads_unlinked_customer_id',
+)
 
-def link_badlead_to_leadstatus(conn, dry_run: bool = True):
-    """Link BadLead records to LeadStatus."""
-    cursor = conn.cursor()
-    
-    # Strategy: Match BadLead to LeadStatus via BookedOpportunity -> Customer
-    # Then find LeadStatus records for the same customer
+# Earliest LeadStatus per customer, created by MATCH_VIEW_MIGRATION
+MATCH_VIEW_MIGRATION = "sql/migrations/20250103000000_customer_first_lead_status_view.sql"
+MATCH_VIEW = "customer_first_lead_status"
+
+# BadLead column -> MATCH_VIEW column it matches, in priority order:
+# email matches take priority over phone, and phone over customer_id
+MATCH_STRATEGIES = [
+    ('customer_email', 'email'),
+    ('customer_phone', 'phone'),
+    ('customer_id', 'customer_id'),
+]
+
+
+def refresh_match_view(conn, dry_run: bool = True):
+    """
+    Refresh MATCH_VIEW so the match strategies see current LeadStatus links.
     
-    # First, match via email
-    cursor.execute("""
-        UPDATE bad_leads bl
-        SET lead_status_id = (
-            SELECT ls.id
-            FROM lead_status ls
-            JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-            JOIN customers c ON bo.customer_id = c.id
-            WHERE c.email = bl.customer_email
-              AND c.email IS NOT NULL
-              AND bl.customer_email IS NOT NULL
-            ORDER BY ls.created_at ASC
-            LIMIT 1
-        ),
-        updated_at = NOW()
-        WHERE bl.lead_status_id IS NULL
-          AND bl.customer_email IS NOT NULL
-          AND EXISTS (
-              SELECT 1
-              FROM lead_status ls
-              JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-              JOIN customers c ON bo.customer_id = c.id
-              WHERE c.email = bl.customer_email
-          )
-    """)
+    A dry run leaves the view as it is, so its counts reflect the view's last refresh.
+    """
+    if dry_run:
+        logger.info(f"[DRY RUN] Would refresh {MATCH_VIEW}; counts use its current contents")
+        return
     
-    email_matches = cursor.rowcount
+    cursor = conn.cursor()
+    try:
+        # CONCURRENTLY keeps the view readable while it refreshes
+        cursor.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}").format(sql.Identifier(MATCH_VIEW)))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def build_match_update(position: int) -> sql.Composed:
+    """
+    Build the UPDATE for the strategy at MATCH_STRATEGIES[position].
     
-    # Match via phone
-    cursor.execute("""
+    The earliest LeadStatus per match key is picked from MATCH_VIEW with DISTINCT ON.
+    BadLeads that an earlier strategy matches are skipped by anti-joins, so the
+    strategies update disjoint rows and give the same result in any order.
+    """
+    column, match_key = MATCH_STRATEGIES[position]
+    earlier_matches = [
+        sql.SQL("""
+          AND NOT EXISTS (
+              SELECT 1 FROM {view} v WHERE v.{match_key} = bl.{column}
+          )""").format(
+            view=sql.Identifier(MATCH_VIEW),
+            match_key=sql.Identifier(earlier_key),
+            column=sql.Identifier(earlier_column),
+        )
+        for earlier_column, earlier_key in MATCH_STRATEGIES[:position]
+    ]
+    return sql.SQL("""
         UPDATE bad_leads bl
-        SET lead_status_id = (
-            SELECT ls.id
-            FROM lead_status ls
-            JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-            JOIN customers c ON bo.customer_id = c.id
-            WHERE c.phone = bl.customer_phone
-              AND c.phone IS NOT NULL
-              AND bl.customer_phone IS NOT NULL
-            ORDER BY ls.created_at ASC
-            LIMIT 1
-        ),
-        updated_at = NOW()
-        WHERE bl.lead_status_id IS NULL
-          AND bl.customer_phone IS NOT NULL
-          AND EXISTS (
-              SELECT 1
-              FROM lead_status ls
-              JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-              JOIN customers c ON bo.customer_id = c.id
-              WHERE c.phone = bl.customer_phone
-          )
-    """)
+        SET lead_status_id = m.ls_id,
+            updated_at = NOW()
+        FROM (
+            SELECT DISTINCT ON (v.{match_key}) v.{match_key} AS match_key, v.lead_status_id AS ls_id
+            FROM {view} v
+            WHERE v.{match_key} IS NOT NULL
+            ORDER BY v.{match_key}, v.lead_status_created_at ASC
+        ) m
+        WHERE bl.{column} = m.match_key
+          AND bl.lead_status_id IS NULL{earlier_matches}
+    """).format(
+        view=sql.Identifier(MATCH_VIEW),
+        match_key=sql.Identifier(match_key),
+        column=sql.Identifier(column),
+        earlier_matches=sql.SQL("").join(earlier_matches),
+    )
+
+
+def run_match_strategy(conn, position: int) -> int:
+    """Run one match strategy's UPDATE without committing; returns the rows it linked."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(build_match_update(position))
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def link_badlead_to_leadstatus(conn, dry_run: bool = True):
+    """Link BadLead records to LeadStatus."""
+    # Strategy: Match BadLead to LeadStatus via BookedOpportunity -> Customer
+    # Then find LeadStatus records for the same customer
     
-    phone_matches = cursor.rowcount
+    refresh_match_view(conn, dry_run=dry_run)
     
-    # Match via customer_id (if BadLead already has customer_id)
-    cursor.execute("""
-        UPDATE bad_leads bl
-        SET lead_status_id = (
-            SELECT ls.id
-            FROM lead_status ls
-            JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-            WHERE bo.customer_id = bl.customer_id
-              AND bl.customer_id IS NOT NULL
-            ORDER BY ls.created_at ASC
-            LIMIT 1
-        ),
-        updated_at = NOW()
-        WHERE bl.lead_status_id IS NULL
-          AND bl.customer_id IS NOT NULL
-          AND EXISTS (
-              SELECT 1
-              FROM lead_status ls
-              JOIN booked_opportunities bo ON ls.booked_opportunity_id = bo.id
-              WHERE bo.customer_id = bl.customer_id
-          )
-    """)
+    # The strategies update disjoint BadLeads, so each runs concurrently on its own
+    # connection. Nothing is committed until every strategy has finished; the commits
+    # themselves are not atomic across connections, but a partial commit is safe to
+    # re-run because every strategy only touches BadLeads with lead_status_id IS NULL.
+    conns = [conn]
+    try:
+        for _ in MATCH_STRATEGIES[1:]:
+            conns.append(get_db_connection())
+        
+        with ThreadPoolExecutor(max_workers=len(conns)) as executor:
+            futures = [
+                executor.submit(run_match_strategy, strategy_conn, position)
+                for position, strategy_conn in enumerate(conns)
+            ]
+            counts = [future.result() for future in futures]
+        
+        for strategy_conn in conns:
+            if dry_run:
+                strategy_conn.rollback()
+            else:
+                strategy_conn.commit()
+    except Exception:
+        for strategy_conn in conns:
+            strategy_conn.rollback()
+        raise
+    finally:
+        for strategy_conn in conns[1:]:
+            strategy_conn.close()
     
-    customer_id_matches = cursor.rowcount
+    matches = {column: count for (column, _), count in zip(MATCH_STRATEGIES, counts)}
+    email_matches = matches['customer_email']
+    phone_matches = matches['customer_phone']
+    customer_id_matches = matches['customer_id']
     
     total_matches = email_matches + phone_matches + customer_id_matches
     
     if not dry_run:
-        conn.commit()
         logger.info(f"Linked BadLead records: {email_matches} via email, {phone_matches} via phone, {customer_id_matches} via customer_id")
     else:
         logger.info(f"[DRY RUN] Would link BadLead records: {email_matches} via email, {phone_matches} via phone, {customer_id_matches} via customer_id")
     
-    cursor.close()
     return total_matches
 
 
@@ -153,8 +195,16 @@ def main():
                                                       notes="Backfill existing NULL relationships"):
             return 0
         
-        # Check if there's any work to do
+        warn_missing_indexes(conn, PARTIAL_INDEXES, PARTIAL_INDEX_MIGRATION)
+        
         cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (MATCH_VIEW,))
+        if not cursor.fetchone()[0]:
+            cursor.close()
+            logger.error(f"Materialized view {MATCH_VIEW} is missing; apply {MATCH_VIEW_MIGRATION}")
+            return 1
+        
+        # Check if there's any work to do
         cursor.execute("""
             SELECT COUNT(*) 
             FROM bad_leads 
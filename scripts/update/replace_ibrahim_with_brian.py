@@ -5,6 +5,7 @@ Replace Ibrahim K with Brian K across all jobs and link all jobs to SalesPerson
 import sys
 from pathlib import Path
 import psycopg2
+from psycopg2.extras import execute_values
 import logging
 from typing import Dict
 
@@ -22,35 +23,41 @@ def replace_ibrahim_with_brian(conn, dry_run: bool = True) -> int:
     cursor = conn.cursor()
     
     try:
-        # Count jobs with Ibrahim variations (handle trailing spaces)
-        cursor.execute("""
-            SELECT COUNT(*) FROM jobs 
-            WHERE TRIM(sales_person_name) ILIKE '%Ibrahim%'
-        """)
-        ibrahim_count = cursor.fetchone()[0]
-        logger.info(f"Found {ibrahim_count:,} jobs with Ibrahim variations")
-        
-        if ibrahim_count == 0:
-            logger.info("No jobs with Ibrahim found")
-            return 0
-        
         if dry_run:
+            # Count jobs with Ibrahim variations. Leading/trailing spaces cannot change a
+            # substring match, so ILIKE runs on the bare column where the trigram index applies
+            cursor.execute("""
+                SELECT COUNT(*) FROM jobs 
+                WHERE sales_person_name ILIKE '%Ibrahim%'
+            """)
+            ibrahim_count = cursor.fetchone()[0]
+            logger.info(f"Found {ibrahim_count:,} jobs with Ibrahim variations")
+            
+            if ibrahim_count == 0:
+                logger.info("No jobs with Ibrahim found")
+                return 0
+            
             logger.info("[DRY RUN] Would replace 'Ibrahim K' with 'Brian K' in jobs")
             return ibrahim_count
         
-        # Replace Ibrahim K variations with Brian K (handle trailing spaces)
+        # Replace Ibrahim K variations with Brian K (handle trailing spaces).
+        # No separate COUNT first: the UPDATE's rowcount tells us whether there was work.
         cursor.execute("""
             UPDATE jobs 
             SET sales_person_name = 'Brian K',
                 updated_at = NOW()
-            WHERE TRIM(sales_person_name) ILIKE '%Ibrahim%'
-            AND (TRIM(sales_person_name) ILIKE '%Ibrahim K%' 
-                 OR TRIM(sales_person_name) ILIKE '%Ibrahim Keshavarz%'
+            WHERE sales_person_name ILIKE '%Ibrahim%'
+            AND (sales_person_name ILIKE '%Ibrahim K%' 
+                 OR sales_person_name ILIKE '%Ibrahim Keshavarz%'
                  OR TRIM(sales_person_name) = 'Ibrahim')
         """)
         updated = cursor.rowcount
         conn.commit()
         
+        if updated == 0:
+            logger.info("No jobs with Ibrahim found")
+            return 0
+        
         logger.info(f"✓ Replaced 'Ibrahim K' with 'Brian K' in {updated:,} jobs")
         return updated
     
@@ -205,32 +212,21 @@ def link_all_jobs_to_salespersons(conn, dry_run: bool = True) -> dict:
             results['unmatched'] = len(unmatched)
             return results
         
-        # Update jobs with sales_person_id (handle all variations of the name)
-        # First, update jobs that are already linked but might need updating
+        # Update jobs with sales_person_id (handle all variations of the name) in one
+        # statement joined to a VALUES list of (name, SalesPerson id) pairs.
+        # IS DISTINCT FROM relinks jobs linked to the wrong SalesPerson (in case the link
+        # was wrong) as well as jobs that are not linked yet (NULL).
         total_updated = 0
-        for clean_name, sp_id in mapping.items():
-            # Update all jobs with this name (including variations with trailing spaces)
-            # Update even if already linked (in case the link was wrong)
-            cursor.execute("""
-                UPDATE jobs 
-                SET sales_person_id = %s,
-                    updated_at = NOW()
-                WHERE TRIM(sales_person_name) = %s
-                AND sales_person_id != %s
-            """, (sp_id, clean_name, sp_id))
-            updated = cursor.rowcount
-            total_updated += updated
-            
-            # Also update jobs that are NULL
-            cursor.execute("""
-                UPDATE jobs 
-                SET sales_person_id = %s,
+        if mapping:
+            execute_values(cursor, """
+                UPDATE jobs j
+                SET sales_person_id = v.sales_person_id,
                     updated_at = NOW()
-                WHERE TRIM(sales_person_name) = %s
-                AND sales_person_id IS NULL
-            """, (sp_id, clean_name))
-            updated = cursor.rowcount
-            total_updated += updated
+                FROM (VALUES %s) AS v(sales_person_name, sales_person_id)
+                WHERE TRIM(j.sales_person_name) = v.sales_person_name
+                AND j.sales_person_id IS DISTINCT FROM v.sales_person_id
+            """, list(mapping.items()), page_size=len(mapping))  # one page keeps rowcount complete
+            total_updated = cursor.rowcount
         
         conn.commit()
         logger.info(f"✓ Linked {total_updated:,} jobs to SalesPerson records")
@@ -292,12 +288,15 @@ def main():
         if not dry_run:
             cursor = conn.cursor()
             try:
-                cursor.execute("SELECT COUNT(*) FROM jobs WHERE sales_person_id IS NOT NULL")
-                linked_count = cursor.fetchone()[0]
-                cursor.execute("SELECT COUNT(*) FROM jobs WHERE sales_person_id IS NULL AND sales_person_name IS NOT NULL")
-                unlinked_count = cursor.fetchone()[0]
-                cursor.execute("SELECT COUNT(*) FROM jobs")
-                total_count = cursor.fetchone()[0]
+                # One pass over jobs for all three counts
+                cursor.execute("""
+                    SELECT
+                        COUNT(*) FILTER (WHERE sales_person_id IS NOT NULL),
+                        COUNT(*) FILTER (WHERE sales_person_id IS NULL AND sales_person_name IS NOT NULL),
+                        COUNT(*)
+                    FROM jobs
+                """)
+                linked_count, unlinked_count, total_count = cursor.fetchone()
                 
                 logger.info("")
                 logger.info("Final Status:")
@@ -6,6 +6,7 @@ Update all SalesPerson links in Jobs, BookedOpportunities, and leads using sales
 import sys
 from pathlib import Path
 import psycopg2
+from psycopg2.extras import execute_values
 import logging
 from typing import Dict, Optional
 
@@ -97,31 +98,40 @@ def update_jobs_salesperson_links(conn, salesperson_map: Dict[str, str], dry_run
     updated = 0
     
     try:
-        # Get all jobs with sales_person_name but no sales_person_id or mismatched
+        # Matching only depends on the name, so fetch each distinct sales_person_name with
+        # its job count instead of pulling every job row into Python
         cursor.execute("""
-            SELECT id, sales_person_name, sales_person_id
+            SELECT sales_person_name, COUNT(*)
             FROM jobs
             WHERE sales_person_name IS NOT NULL
+            GROUP BY sales_person_name
             ORDER BY sales_person_name
         """)
         
-        jobs = cursor.fetchall()
-        logger.info(f"Found {len(jobs)} jobs with sales_person_name")
+        name_counts = cursor.fetchall()
+        total_jobs = sum(count for _, count in name_counts)
+        logger.info(f"Found {total_jobs} jobs with sales_person_name ({len(name_counts)} distinct names)")
         
         if dry_run:
             logger.info("[DRY RUN] Would update jobs sales_person_id links")
-            return len(jobs)
+            return total_jobs
         
-        for job_id, sales_person_name, current_sales_person_id in jobs:
+        matches = []  # (sales_person_name, sales_person_id)
+        for sales_person_name, _ in name_counts:
             matched_id = match_name_to_salesperson(sales_person_name, salesperson_map)
-            
-            if matched_id and matched_id != current_sales_person_id:
-                cursor.execute("""
-                    UPDATE jobs
-                    SET sales_person_id = %s, updated_at = NOW()
-                    WHERE id = %s
-                """, (matched_id, job_id))
-                updated += 1
+            if matched_id:
+                matches.append((sales_person_name, matched_id))
+        
+        if matches:
+            # One UPDATE joined to the matched names; a single page keeps rowcount complete
+            execute_values(cursor, """
+                UPDATE jobs j
+                SET sales_person_id = v.sales_person_id, updated_at = NOW()
+                FROM (VALUES %s) AS v(sales_person_name, sales_person_id)
+                WHERE j.sales_person_name = v.sales_person_name
+                AND j.sales_person_id IS DISTINCT FROM v.sales_person_id
+            """, matches, page_size=len(matches))
+            updated = cursor.rowcount
         
         conn.commit()
         logger.info(f"Updated {updated} jobs with SalesPerson links")
@@ -79,3 +79,45 @@ def check_and_log_execution(conn: psycopg2.extensions.connection, script_name: s
     log_script_execution(conn, script_name, notes)
     return True
 
+
+def try_acquire_script_lock(conn: psycopg2.extensions.connection, script_name: str) -> bool:
+    """
+    Take a session-level advisory lock named after the script, without waiting.
+    
+    Keeps two runs of the same script from working concurrently. The lock is
+    released by release_script_lock or when the connection closes.
+    
+    Args:
+        conn: Database connection
+        script_name: Name of the script
+        
+    Returns:
+        True if the lock was acquired, False if another run holds it
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (script_name,))
+        acquired = cursor.fetchone()[0]
+        conn.commit()
+        return acquired
+    finally:
+        cursor.close()
+
+
+def release_script_lock(conn: psycopg2.extensions.connection, script_name: str) -> None:
+    """
+    Release the advisory lock taken by try_acquire_script_lock.
+    
+    Args:
+        conn: Database connection
+        script_name: Name of the script
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (script_name,))
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Failed to release script lock: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
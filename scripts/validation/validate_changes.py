@@ -12,7 +12,7 @@ from typing import Dict
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from scripts.utils.database import get_db_connection
+from scripts.utils.database import get_db_connection, estimate_count
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -160,33 +160,36 @@ def validate_branch_cleanup(conn) -> Dict:
         cursor.close()
 
 
-def validate_performance_data(conn) -> Dict:
-    """Validate performance data import."""
+def validate_performance_data(conn, exact: bool = True) -> Dict:
+    """
+    Validate performance data import.
+    
+    Args:
+        exact: Count rows exactly. Pass False to use planner estimates instead,
+            which are only trustworthy once the tables have been re-analyzed
+            since the last import or link run.
+    """
     cursor = conn.cursor()
     results = {'passed': True, 'issues': []}
     
     try:
-        # Check SalesPerformance
-        cursor.execute("SELECT COUNT(*) FROM sales_performance")
-        sp_count = cursor.fetchone()[0]
+        if exact:
+            # Record and SalesPerson link counts for both tables: one scan each, one round-trip
+            cursor.execute("""
+                SELECT sp.total, sp.linked, up.total, up.linked
+                FROM
+                    (SELECT COUNT(*) as total, COUNT(sales_person_id) as linked FROM sales_performance) sp,
+                    (SELECT COUNT(*) as total, COUNT(sales_person_id) as linked FROM user_performance) up
+            """)
+            sp_count, sp_linked, up_count, up_linked = cursor.fetchone()
+        else:
+            sp_count = estimate_count(cursor, 'sales_performance')
+            sp_linked = estimate_count(cursor, 'sales_performance', 'sales_person_id IS NOT NULL')
+            up_count = estimate_count(cursor, 'user_performance')
+            up_linked = estimate_count(cursor, 'user_performance', 'sales_person_id IS NOT NULL')
         logger.info(f"SalesPerformance records: {sp_count}")
-        
-        # Check UserPerformance
-        cursor.execute("SELECT COUNT(*) FROM user_performance")
-        up_count = cursor.fetchone()[0]
         logger.info(f"UserPerformance records: {up_count}")
         
-        # Check SalesPerson links
-        cursor.execute("""
-            SELECT COUNT(*) FROM sales_performance WHERE sales_person_id IS NOT NULL
-        """)
-        sp_linked = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM user_performance WHERE sales_person_id IS NOT NULL
-        """)
-        up_linked = cursor.fetchone()[0]
-        
         logger.info(f"SalesPerformance linked to SalesPerson: {sp_linked}/{sp_count}")
         logger.info(f"UserPerformance linked to SalesPerson: {up_linked}/{up_count}")
         
@@ -208,45 +211,26 @@ def validate_data_integrity(conn) -> Dict:
     results = {'passed': True, 'issues': []}
     
     try:
-        # Check for orphaned SalesPerson links in Jobs
+        # Check jobs for orphaned SalesPerson, branch and customer links in a single pass.
+        # Each join is on a primary key, so it never multiplies job rows.
         cursor.execute("""
-            SELECT COUNT(*) 
+            SELECT 
+                COUNT(*) FILTER (WHERE j.sales_person_id IS NOT NULL AND sp.id IS NULL),
+                COUNT(*) FILTER (WHERE j.branch_id IS NOT NULL AND b.id IS NULL),
+                COUNT(*) FILTER (WHERE j.customer_id IS NOT NULL AND c.id IS NULL)
             FROM jobs j
-            WHERE j.sales_person_id IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM sales_persons sp WHERE sp.id = j.sales_person_id
-            )
+            LEFT JOIN sales_persons sp ON sp.id = j.sales_person_id
+            LEFT JOIN branches b ON b.id = j.branch_id
+            LEFT JOIN customers c ON c.id = j.customer_id
         """)
-        orphaned_jobs = cursor.fetchone()[0]
+        orphaned_jobs, orphaned_branches_jobs, orphaned_customers = cursor.fetchone()
         
         if orphaned_jobs > 0:
             results['issues'].append(f"{orphaned_jobs} jobs have invalid sales_person_id")
         
-        # Check for orphaned branch links
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM jobs j
-            WHERE j.branch_id IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM branches b WHERE b.id = j.branch_id
-            )
-        """)
-        orphaned_branches_jobs = cursor.fetchone()[0]
-        
         if orphaned_branches_jobs > 0:
             results['issues'].append(f"{orphaned_branches_jobs} jobs have invalid branch_id")
         
-        # Check for orphaned customer links
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM jobs j
-            WHERE j.customer_id IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM customers c WHERE c.id = j.customer_id
-            )
-        """)
-        orphaned_customers = cursor.fetchone()[0]
-        
         if orphaned_customers > 0:
             results['issues'].append(f"{orphaned_customers} jobs have invalid customer_id")
         
@@ -258,6 +242,15 @@ def validate_data_integrity(conn) -> Dict:
 
 def main():
     """Main execution function."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Validate database changes')
+    parser.add_argument('--estimate', action='store_true',
+                       help='Use planner estimates instead of exact row counts (faster, '
+                            'but stale until the tables are re-analyzed)')
+    
+    args = parser.parse_args()
+    
     conn = get_db_connection()
     
     try:
@@ -289,7 +282,7 @@ def main():
         
         # Validate performance data
         logger.info("\n3. Validating Performance data...")
-        perf_results = validate_performance_data(conn)
+        perf_results = validate_performance_data(conn, exact=not args.estimate)
         if perf_results['issues']:
             all_passed = False
             for issue in perf_results['issues']:
@@ -0,0 +1,35 @@
+-- Migration: Partial indexes for the relationship backfill scripts
+-- Covers only the rows complete_quote_linkage.py and link_badlead_to_leadstatus.py
+-- still have to link, so the indexes shrink towards empty as the backfills progress
+-- Created: 2025-01-02
+
+-- create index concurrently cannot run inside a transaction block,
+-- so apply this file without psql's --single-transaction option
+
+-- ============================================================================
+-- Quote Number Linkage (complete_quote_linkage.py)
+-- ============================================================================
+
+create index concurrently if not exists idx_lead_status_unlinked_quote_number
+    on lead_status(quote_number)
+    where booked_opportunity_id is null and quote_number is not null;
+
+create index concurrently if not exists idx_lost_leads_unlinked_quote_number
+    on lost_leads(quote_number)
+    where booked_opportunity_id is null and quote_number is not null;
+
+-- ============================================================================
+-- BadLead to LeadStatus Linkage (link_badlead_to_leadstatus.py)
+-- ============================================================================
+
+create index concurrently if not exists idx_bad_leads_unlinked_customer_email
+    on bad_leads(customer_email)
+    where lead_status_id is null and customer_email is not null;
+
+create index concurrently if not exists idx_bad_leads_unlinked_customer_phone
+    on bad_leads(customer_phone)
+    where lead_status_id is null and customer_phone is not null;
+
+create index concurrently if not exists idx_bad_leads_unlinked_customer_id
+    on bad_leads(customer_id)
+    where lead_status_id is null and customer_id is not null;
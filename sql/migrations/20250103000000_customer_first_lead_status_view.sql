@@ -0,0 +1,37 @@
+-- Migration: Pre-joined view of each customer's first LeadStatus
+-- Used by link_badlead_to_leadstatus.py so its email, phone and customer_id
+-- match strategies share one lead_status -> booked_opportunities -> customers join
+-- Created: 2025-01-03
+
+-- create index concurrently cannot run inside a transaction block,
+-- so apply this file without psql's --single-transaction option
+
+-- ============================================================================
+-- Customer First LeadStatus View
+-- ============================================================================
+
+create materialized view if not exists customer_first_lead_status as
+select distinct on (c.id)
+    c.id as customer_id,
+    c.email,
+    c.phone,
+    ls.id as lead_status_id,
+    ls.created_at as lead_status_created_at
+from lead_status ls
+join booked_opportunities bo on ls.booked_opportunity_id = bo.id
+join customers c on bo.customer_id = c.id
+order by c.id, ls.created_at;
+
+-- The unique index is required for refresh materialized view concurrently
+create unique index concurrently if not exists idx_customer_first_lead_status_customer_id
+    on customer_first_lead_status(customer_id);
+
+create index concurrently if not exists idx_customer_first_lead_status_email
+    on customer_first_lead_status(email)
+    where email is not null;
+
+create index concurrently if not exists idx_customer_first_lead_status_phone
+    on customer_first_lead_status(phone)
+    where phone is not null;
+
+comment on materialized view customer_first_lead_status is 'Earliest LeadStatus per customer; refreshed by link_badlead_to_leadstatus.py before matching';
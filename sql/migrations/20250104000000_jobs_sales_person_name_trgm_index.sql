@@ -0,0 +1,12 @@
+-- Migration: Trigram index on jobs.sales_person_name
+-- Lets substring matches such as replace_ibrahim_with_brian.py's
+-- sales_person_name ilike '%Ibrahim%' use an index instead of scanning jobs
+-- Created: 2025-01-04
+
+-- create index concurrently cannot run inside a transaction block,
+-- so apply this file without psql's --single-transaction option
+
+create extension if not exists pg_trgm;
+
+create index concurrently if not exists idx_jobs_sales_person_name_trgm
+    on jobs using gin (sales_person_name gin_trgm_ops);